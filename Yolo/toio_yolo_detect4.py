@@ -1,10 +1,10 @@
 import cv2
 import numpy as np
-from pyzbar.pyzbar import decode
 import asyncio
 import websockets
 import json
-from pyzbar.pyzbar import decode, ZBarSymbol
+import os
+import sys
 import threading
 import time
 import queue
@@ -12,7 +12,14 @@ from collections import deque
 
 import warnings
 warnings.filterwarnings('ignore')
-from ultralytics import YOLO
+
+# ultralytics/torch 在加载模型时才导入（见 inference_backends）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from detection_batch import from_array
+from frame_pool import FramePool, release_frame
+from inference_backends import load_inference_model
+from inference_worker import results_to_array
+from startup import StartupTimer
 
 # ========== 参数配置 ==========
 VIDEO_URL = 0  
@@ -32,39 +39,45 @@ websocket_clients = set()
 is_running = True
 
 # 异步处理相关
-frame_queue = queue.Queue(maxsize=2)  # 帧队列
+frame_queue = queue.Queue(maxsize=2)  # 帧队列（PooledFrame，检测线程用完后释放）
+frame_pool = FramePool()  # 摄像头画面缓冲池，避免每帧分配新数组
 detection_results = {}  # 检测结果缓存
 last_detection_time = time.time()
 DETECTION_INTERVAL = 0.1  # 检测间隔（秒），控制检测频率
 
 # ========== YOLO模型 ==========
+MODEL_PATH = 'best-obb-225.pt'
+WARMUP_RUNS = 3
 model = None
 
+# 启动耗时统计（秒）
+startup_timer = StartupTimer({'camera': 3.0, 'model_load': 5.0, 'warmup': 2.0, '总计': 10.0})
+
 def initialize_model():
     """初始化YOLO模型"""
     global model
     try:
         print("🔧 Loading YOLO model...")
-        model = YOLO('best-obb-225.pt')
-    
-        # 优化设置
-        model.overrides.update({
-            'verbose': False,
-            'device': 0,
-            'half': False,
-            'dnn': False,
-            'agnostic_nms': True,
-            'max_det': 50,
-        })   # 减少输出
+        # 优化设置；优先加载缓存中已融合的模型
+        with startup_timer.phase('model_load'):
+            model, _ = load_inference_model(MODEL_PATH, 'torch', 640, {
+                'verbose': False,
+                'device': 0,
+                'half': False,
+                'dnn': False,
+                'agnostic_nms': True,
+                'max_det': 50,
+            })
 
-        # #模型预热
-        # print("🔥 Warming up model...")
-        # dunmmy_input = np.zeros((640, 640, 3), dtype=np.uint8)
-        # for i in range(3):
-        #     _ = model.predict(dunmmy_input, verbose=False, imgsz=640)
+        # 模型预热
+        print("🔥 Warming up model...")
+        with startup_timer.phase('warmup'):
+            dummy_input = np.zeros((640, 640, 3), dtype=np.uint8)
+            for i in range(WARMUP_RUNS):
+                _ = model.predict(dummy_input, verbose=False, imgsz=640)
 
-        # print("✅ Model warmed up and optimized")
-        # return True
+        print("✅ Model warmed up and optimized")
+        return True
     except Exception as e:
         print(f"❌ Model initialization error: {e}")
         return False
@@ -102,91 +115,58 @@ def detect_boxes(frame):
             half=False
         )
     
-        detections = []
-        # scale_x = w / new_w  # 坐标还原比例
-        # scale_y = h / new_h
-        
-        for r in myresult:
-            if r.obb is not None and len(r.obb.data) > 0:
-                for detection in r.obb.data:
-                    try:
-                        # 获取检测数据
-                        det_data = detection.cpu().numpy()
-                        center_x = det_data[0]
-                        center_y = det_data[1]
-                        width = det_data[2]
-                        height = det_data[3]
-                        angle = det_data[4]
-                        conf = det_data[5]
-                        cls = int(det_data[6])
-                        
-                        # 建立坐标系（使用5号目标）
-                        if cls == 5 and center is None:
-                            center = np.array([center_x, center_y], dtype=np.float32)
-                            reference_angle = angle
-                            cos_a = np.cos(-np.radians(reference_angle))
-                            sin_a = np.sin(-np.radians(reference_angle))
-                            R = np.array([[cos_a, -sin_a], [sin_a, cos_a]])
-                            scale_factor = 50.0 / width
-                            print(f"✅ Coordinate system: Center({center_x:.1f},{center_y:.1f}), Angle:{reference_angle:.1f}°")
-                        
-                        # 计算相对坐标（如果坐标系已建立）
-                        if center is not None:
-                            vec = np.array([center_x, center_y]) - center
-                            transformed = scale_factor * (R @ vec)
-    
-                            x = np.clip(transformed[0], -25, 25)
-                            z = np.clip(transformed[1], -25, 25)
-    
-                            # ID映射
-                            output_id = str(cls)
-                            if cls == 3:
-                                output_id = "0"
-                            elif cls == 0:
-                                output_id = "3"
-
-                            detection_result = {
-                            "id": output_id,
-                            "x": float(round(x, 2)),
-                            "z": float(round(z, 2)),
-                            "angle": float(round(angle - reference_angle, 2)),
-                            "pixel_x": center_x,
-                            "pixel_y": center_y,
-                            "conf": float(conf)
-                            }
-                            detections.append(detection_result)
-
-                        # 如果坐标系已建立，计算相对坐标；否则仅返回像素坐标
-                        if center is not None and scale_factor is not None and R is not None:
-                            vec = np.array([center_x, center_y]) - center
-                            transformed = scale_factor * (R @ vec)
+        # 整批转换检测结果，类别ID通过查找表映射
+        batch = from_array(results_to_array(myresult))
+        if len(batch) == 0:
+            return []
 
-                            x = float(round(np.clip(transformed[0], -25, 25), 2))
-                            z = float(round(np.clip(transformed[1], -25, 25), 2))
-                        else:
-                            x, z = None, None  # 尚未建立坐标系
+        # 建立坐标系（使用5号目标）
+        if center is None:
+            references = batch[batch['class_id'] == 5]
+            if len(references) > 0:
+                reference = references[0]
+                center = np.array([reference['center_x'], reference['center_y']], dtype=np.float32)
+                reference_angle = float(reference['angle'])
+                cos_a = np.cos(-np.radians(reference_angle))
+                sin_a = np.sin(-np.radians(reference_angle))
+                R = np.array([[cos_a, -sin_a], [sin_a, cos_a]])
+                scale_factor = 50.0 / float(reference['width'])
+                print(f"✅ Coordinate system: Center({center[0]:.1f},{center[1]:.1f}), Angle:{reference_angle:.1f}°")
 
-                        detection_result = {
-                            "id": output_id,
-                            "x": x,
-                            "z": z,
-                            "angle": float(round(angle, 2)) if reference_angle is None else float(round(angle - reference_angle, 2)),
-                            "pixel_x": center_x,
-                            "pixel_y": center_y,
-                            "conf": float(conf)
-                        }
-                        detections.append(detection_result)
-                    except Exception as e:
-                        print(f"Detection parsing error: {e}")
-                        continue
-            print("Detection:", detections)                  
-        
-        return detections
+        return batch_to_poses(batch)
         
     except Exception as e:
         print(f"❌ Detection error: {e}")
         return []
 
+def batch_to_poses(batch):
+    """把检测批次转换为WebSocket发送的位姿列表（坐标变换整批计算）"""
+    pixels = np.stack([batch['center_x'], batch['center_y']], axis=1).astype(np.float64)
+
+    # 如果坐标系已建立，计算相对坐标；否则仅返回像素坐标
+    if center is not None and scale_factor is not None and R is not None:
+        transformed = scale_factor * ((pixels - center) @ R.T)
+        coords = np.round(np.clip(transformed, -25, 25), 2).tolist()
+        angles = np.round(batch['angle'] - reference_angle, 2).tolist()
+    else:
+        coords = [(None, None)] * len(batch)
+        angles = np.round(batch['angle'], 2).tolist()
+
+    return [
+        {
+            "id": str(cube_id),
+            "x": x,
+            "z": z,
+            "angle": angle,
+            "pixel_x": pixel_x,
+            "pixel_y": pixel_y,
+            "conf": conf,
+        }
+        for cube_id, (x, z), angle, (pixel_x, pixel_y), conf in zip(
+            batch['cube_id'].tolist(), coords, angles, pixels.tolist(), batch['confidence'].tolist()
+        )
+    ]
+
 def detection_worker():
     """检测工作线程"""
     global frame_queue, detection_results, latest_poses, is_running
@@ -199,7 +179,10 @@ def detection_worker():
                 
                 # 执行检测
                 start_time = time.time()
-                poses = detect_boxes(frame)
+                try:
+                    poses = detect_boxes(frame.array)
+                finally:
+                    frame.release()
                 detection_time = time.time() - start_time
                 
                 # 更新结果
@@ -210,7 +193,7 @@ def detection_worker():
                 # 清空队列中的旧帧
                 while not frame_queue.empty():
                     try:
-                        frame_queue.get_nowait()
+                        frame_queue.get_nowait().release()
                     except queue.Empty:
                         break
             else:
@@ -235,12 +218,22 @@ def camera_loop():
     
     # 缓存最后的检测结果用于显示
     cached_poses = []
+    display_frame = None  # 复用的显示缓冲区，叠加层画在这里而不是原始画面上
     
     try:
         while is_running:
-            ret, frame = cap.read()
+            buffer = frame_pool.acquire()
+            if buffer is None:
+                ret, frame = cap.read()
+            else:
+                ret, frame = cap.read(buffer.array)
             if not ret:
+                release_frame(buffer)
                 continue
+            if buffer is None or frame is not buffer.array:
+                # 首帧或分辨率变化：摄像头分配了新数组，纳入缓冲池管理
+                release_frame(buffer)
+                buffer = frame_pool.wrap(frame)
 
             frame_count += 1
             current_time = time.time()
@@ -250,9 +243,9 @@ def camera_loop():
                 display_fps = 30 / (current_time - fps_start_time)
                 fps_start_time = current_time
 
-            # 添加每一帧到检测队列
+            # 添加每一帧到检测队列（检测线程持有引用，不复制画面）
             if frame_queue.empty():  # 只在队列为空时添加新帧
-                frame_queue.put(frame.copy())
+                frame_queue.put(buffer.retain())
 
             # 获取最新检测结果
             if 'poses' in detection_results:
@@ -260,8 +253,11 @@ def camera_loop():
                 if 'detection_time' in detection_results:
                     detection_fps = 1.0 / detection_results['detection_time'] if detection_results['detection_time'] > 0 else 0
 
-            # 创建显示画面
-            display_frame = frame.copy()
+            # 创建显示画面：复制到复用的显示缓冲区，原始画面立即交还缓冲池
+            if display_frame is None or display_frame.shape != frame.shape:
+                display_frame = np.empty_like(frame)
+            np.copyto(display_frame, frame)
+            buffer.release()
             
             # 显示性能信息
             cv2.putText(display_frame, f"Display FPS: {display_fps:.1f}", (10, 30), 
@@ -395,13 +391,18 @@ def main():
     
     try:
         # 初始化摄像头
-        if not initialize_camera():
+        with startup_timer.phase('camera'):
+            camera_ok = initialize_camera()
+        if not camera_ok:
             print("Camera initialization failed")
             return
         
         # 初始化模型
-        initialize_model()
+        if not initialize_model():
+            print("Model initialization failed")
+            return
         
+        startup_timer.report()
         print("🎬 Starting optimized real-time detection system...")
         
         # 启动检测工作线程
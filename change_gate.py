@@ -0,0 +1,116 @@
+import time
+
+import cv2
+import numpy as np
+
+from detection_batch import EMPTY_BATCH
+from inference_roi import align_roi, clip_roi
+
+# ========== 变化检测配置 ==========
+DOWNSAMPLE = 4                # 差分前缩小的倍数（640×480 → 160×120）
+CELL_SIZE = 8                 # 缩小后每个网格单元的边长（像素），对应原图 32×32
+PIXEL_DIFF_THRESHOLD = 18     # 灰度差超过该值的像素视为变化（过滤摄像头噪声）
+CELL_MOTION_THRESHOLD = 0.08  # 单元内变化像素比例超过该值时认为该区域有运动
+REGION_MARGIN = 40            # 变化区域外扩的边距（原图像素），保证运动中的目标完整落在区域内
+REGION_MAX_FRACTION = 0.5     # 变化区域超过画面该比例时直接整帧检测
+MAX_REUSE_TIME = 2.0          # 最长连续复用检测结果的时间（秒），超过后强制整帧检测
+
+
+class ChangeGate:
+    """变化检测门控：画面静止时复用上一帧的检测结果
+
+    对缩小的灰度图与上次推理时的参考图做差分，按网格统计运动能量：
+    没有变化时直接复用检测批次；只有局部变化时只对变化区域推理，区域外沿用旧检测；
+    变化范围较大或复用时间过长时整帧推理。
+    """
+
+    def __init__(self, detect_fn, max_reuse_time=MAX_REUSE_TIME):
+        self.detect_fn = detect_fn  # detect_fn(frame, roi=None) -> 检测批次
+        self.max_reuse_time = max_reuse_time
+
+        self.reference = None
+        self.batch = EMPTY_BATCH
+        self.last_full_time = 0.0
+
+        self.full_inferences = 0
+        self.region_inferences = 0
+        self.skipped = 0
+
+    def _downsample(self, frame):
+        h, w = frame.shape[:2]
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, (w // DOWNSAMPLE, h // DOWNSAMPLE), interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(small, (3, 3), 0)
+
+    def _changed_cells(self, small):
+        """返回每个网格单元是否有运动的布尔矩阵"""
+        changed = cv2.absdiff(small, self.reference) > PIXEL_DIFF_THRESHOLD
+        rows = changed.shape[0] // CELL_SIZE
+        cols = changed.shape[1] // CELL_SIZE
+        cells = changed[:rows * CELL_SIZE, :cols * CELL_SIZE].reshape(rows, CELL_SIZE, cols, CELL_SIZE)
+        return cells.mean(axis=(1, 3)) > CELL_MOTION_THRESHOLD
+
+    def _changed_region(self, cells, frame_shape):
+        """有运动的网格单元的外接矩形（原图坐标，已外扩并对齐）"""
+        rows, cols = np.nonzero(cells)
+        cell = CELL_SIZE * DOWNSAMPLE
+        roi = clip_roi((
+            cols.min() * cell - REGION_MARGIN,
+            rows.min() * cell - REGION_MARGIN,
+            (cols.max() + 1) * cell + REGION_MARGIN,
+            (rows.max() + 1) * cell + REGION_MARGIN,
+        ), frame_shape)
+        return align_roi(roi, frame_shape)
+
+    def _full(self, frame, small, now):
+        self.batch = self.detect_fn(frame)
+        self.reference = small
+        self.last_full_time = now
+        self.full_inferences += 1
+        return self.batch
+
+    def detect(self, frame):
+        """返回本帧的检测批次（可能是复用的）"""
+        now = time.time()
+        small = self._downsample(frame)
+
+        if self.reference is None or self.reference.shape != small.shape or now - self.last_full_time > self.max_reuse_time:
+            return self._full(frame, small, now)
+
+        cells = self._changed_cells(small)
+        if not cells.any():
+            self.skipped += 1
+            return self.batch
+
+        x0, y0, x1, y1 = self._changed_region(cells, frame.shape)
+        h, w = frame.shape[:2]
+        if (x1 - x0) * (y1 - y0) > REGION_MAX_FRACTION * w * h:
+            return self._full(frame, small, now)
+
+        # 只对变化区域推理，区域外（中心点不在区域内）的旧检测保持不变
+        region_batch = self.detect_fn(frame, (x0, y0, x1, y1))
+        old = self.batch
+        outside = (
+            (old['center_x'] < x0) | (old['center_x'] >= x1)
+            | (old['center_y'] < y0) | (old['center_y'] >= y1)
+        )
+        self.batch = np.concatenate([old[outside], region_batch])
+
+        # 参考图只更新推理过的区域，缓慢变化的区域会持续累积差异直到触发
+        s = DOWNSAMPLE
+        self.reference[y0 // s:y1 // s, x0 // s:x1 // s] = small[y0 // s:y1 // s, x0 // s:x1 // s]
+        self.region_inferences += 1
+        return self.batch
+
+    def reset(self):
+        self.reference = None
+        self.batch = EMPTY_BATCH
+
+    def get_stats(self):
+        total = self.full_inferences + self.region_inferences + self.skipped
+        return {
+            'full_inferences': self.full_inferences,
+            'region_inferences': self.region_inferences,
+            'skipped': self.skipped,
+            'skip_ratio': self.skipped / total if total else 0.0,
+        }
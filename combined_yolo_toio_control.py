@@ -1,5 +1,6 @@
 import asyncio
 import cv2
+import os
 import numpy as np
 import time
 import warnings
@@ -8,25 +9,93 @@ import sys
 from toio import *
 from typing import Dict, List
 from threading import Thread
-import queue
 
 warnings.filterwarnings('ignore')
-from ultralytics import YOLO
-
-# 导入视频流服务器
-try:
-    from video_stream_server import update_detection_frame, start_server
-    VIDEO_STREAM_AVAILABLE = True
-    print("✅ 视频流服务器模块已加载")
-except ImportError:
+
+from change_gate import ChangeGate
+from detection_batch import EMPTY_BATCH, TOIO_IDS, from_array, select_ids
+from event_bus import EventBus
+from frame_capture import LatestFrameCapture
+from frame_pool import release_frame
+from geofence import GeofenceEngine, LeadTimeEstimator, circle_zone
+from inference_backends import load_inference_model
+from inference_profile import PROFILE_PATH, load_profile
+from inference_roi import align_roi, clip_roi, offset_detections, roi_input_size, select_roi
+from inference_scheduler import AdaptiveScheduler
+from inference_worker import EMPTY_DETECTIONS, InferenceProcess, InferenceWorkerPool, pin_inference_threads, results_to_array
+from object_tracker import MultiObjectTracker
+from overlay_renderer import OverlayRenderer
+from preview_window import PreviewWindow
+from sparse_inference import SparseDetector
+from startup import StartupTimer, lazy_import, modules_available
+from tiled_inference import merge_tile_detections, predict_tiled, rotated_nms
+from world_state import WorldState
+
+# 视频流服务器（flask导入较慢，延迟到启动推流时才真正导入）
+VIDEO_STREAM_AVAILABLE = modules_available('flask', 'flask_cors')
+video_stream_server = lazy_import('video_stream_server') if VIDEO_STREAM_AVAILABLE else None
+if video_stream_server is not None:
+    print("✅ 视频流服务器模块已加载（延迟导入）")
+else:
     VIDEO_STREAM_AVAILABLE = False
     print("⚠️  视频流服务器模块未找到，将仅显示本地窗口")
 
 # ========== YOLO配置参数 ==========
 MODEL_PATH = 'Yolo/yolo-obb-best.pt'
 CAMERA_INDEX = 1
+CAMERA_WIDTH = 640             # 摄像头分辨率；大场地可改为1920×1080或3840×2160（圆圈坐标需按新分辨率重新标定）
+CAMERA_HEIGHT = 480
+CAMERA_FPS = 30
 CONF_THRESHOLD = 0.5
 INPUT_SIZE = 640
+INFERENCE_BACKEND = 'torch'    # 推理后端: 'torch' / 'onnx'（ONNX Runtime）/ 'onnx_int8'（INT8量化）/ 'openvino'，首次使用时自动导出
+INFERENCE_PROFILE_PATH = PROFILE_PATH  # tune_inference.py 生成的本机性能配置，存在时覆盖后端、推理尺寸、线程数和摄像头参数
+
+# ========== 推理区域（ROI）配置 ==========
+ROI_MODE = 'tracked'           # 'full' 整帧 / 'circle' 圆圈外扩 / 'tracked' 圆圈与跟踪目标范围的并集（有toio未跟踪到时用整帧） / (x0, y0, x1, y1) 固定区域
+ROI_MARGIN = 80                # ROI在圆圈或目标外扩的边距（像素）
+
+# ========== 切片推理配置 ==========
+USE_TILED_INFERENCE = False    # 高分辨率摄像头时开启：推理区域大于 TILE_SIZE 时切成重叠切片整批推理，避免小目标被缩没
+TILE_SIZE = 640                # 切片边长（像素），按原始分辨率推理
+
+# ========== 丢失目标重新检测配置 ==========
+USE_REDETECTION = True         # toio丢失时在其最后已知/预测位置附近额外做小窗口高分辨率检测
+REDETECT_WINDOW = 192          # 重新检测窗口边长（像素）
+REDETECT_IMGSZ = 384           # 窗口推理尺寸（大于窗口即放大推理，部分遮挡或模糊的目标更容易检出）
+
+# ========== 自适应调度配置 ==========
+LATENCY_TARGET = 0.12          # 采集到检测结果可用的目标延迟（秒），超出时自动降低推理尺寸/频率
+IMGSZ_LADDER = (640, 512, 416, 320)  # 调度器可选的推理尺寸上限
+IDLE_SPEED = 5.0               # 跟踪速度低于该值（像素/秒）视为静止
+
+# ========== 推理进程配置 ==========
+USE_INFERENCE_PROCESS = True   # 在独立进程中运行YOLO推理，避免与控制协程/推流线程争抢GIL
+INFERENCE_RING_SLOTS = 3       # 共享内存帧环形缓冲区的槽位数
+INFERENCE_WORKERS = 1          # 推理进程数；多核CPU上设为2~4时启用进程池流水线推理（按帧序号重排序输出）
+INFERENCE_MAX_LATENCY = 0.5    # 流水线模式下单帧结果的最长等待时间（秒），超时的帧直接丢弃
+WARMUP_RUNS = 2                # 启动时用空白画面预热推理的次数
+
+# ========== 跟踪配置 ==========
+TRACK_MAX_COAST_TIME = 0.5     # 漏检时按卡尔曼预测继续输出位姿的最长时间（秒），期间不判定为丢失
+USE_SPARSE_INFERENCE = False   # 稀疏推理：只在关键帧运行YOLO，中间帧用光流传播位置（CPU推理时建议开启）
+KEYFRAME_INTERVAL = 3          # 初始关键帧间隔，运行中按光流偏差自动调整
+USE_CHANGE_GATE = True         # 画面静止时复用上一帧检测结果，只在有运动的区域重新推理
+CONTROL_SNAPSHOT_TIMEOUT = 0.5 # 控制循环等待下一帧世界状态的最长时间（秒），画面中断时仍能按时判定丢失
+
+# ========== 启动耗时预算（秒） ==========
+STARTUP_BUDGET = {
+    '模型加载': 5.0,
+    '模型预热': 2.0,
+    '摄像头': 3.0,
+    '蓝牙连接': 8.0,
+    'toio初始化': 4.0,
+    '总计': 12.0,
+}
+
+# ========== 显示配置 ==========
+HEADLESS = os.environ.get('TOIO_HEADLESS') == '1' or '--headless' in sys.argv  # 无显示器时不创建窗口，通过 Ctrl+C / SIGTERM / POST /stop 退出
+PREVIEW_MAX_FPS = 15           # 本地预览窗口的最高刷新率（在独立线程中显示，不影响检测帧率）
 
 # ========== 圆圈检测配置 ==========
 CIRCLE_CENTER_X = 355
@@ -35,11 +104,30 @@ CIRCLE_RADIUS = 97
 CIRCLE_COLOR = (0, 0, 0)
 CIRCLE_THICKNESS = 1
 
+# ========== 电子围栏配置 ==========
+# 区域按顺序栅格化（重叠时后面的区域优先），可继续添加 ring_zone / polygon_zone；设置 dwell_time 后停留超时会触发停留事件
+GEOFENCE_ZONES = [
+    circle_zone('circle', (CIRCLE_CENTER_X, CIRCLE_CENTER_Y), CIRCLE_RADIUS),
+]
+GEOFENCE_HYSTERESIS = 4        # 越过区域边界该距离（像素）后才算离开，抑制检测抖动
+EXIT_ZONE = 'circle'           # 离开该区域时toio执行特殊动作
+USE_PREDICTIVE_EXIT = True     # 按跟踪速度预测即将离开 EXIT_ZONE 的toio，提前一个“采集→BLE命令”延迟触发特殊动作
+EXIT_LEAD_TIME = 0.3           # 采集→BLE命令延迟的初始估计（秒），运行中按每次特殊动作的实测延迟更新
+
 # ========== 全局变量 ==========
 model = None
+inference_process = None  # 独立推理进程（启用时代替进程内模型）
 cap = None
-target_status = {}
-exit_event_queue = queue.Queue()  # 用于传递离开圆圈的事件
+frame_capture = None  # 摄像头采集线程（只保留最新帧）
+yolo_ready = False  # 模型和摄像头是否已准备就绪
+startup_timer = StartupTimer(STARTUP_BUDGET)  # 启动各阶段耗时统计
+tracker = MultiObjectTracker(TRACK_MAX_COAST_TIME)  # 多目标跟踪（持久编号 + 漏检外推）
+scheduler = AdaptiveScheduler(LATENCY_TARGET, IMGSZ_LADDER)  # 按延迟调整推理尺寸和频率
+pipeline_frames = {}  # 流水线模式：帧序号 -> (画面, 推理区域)，等待结果返回
+geofence = GeofenceEngine(GEOFENCE_ZONES, GEOFENCE_HYSTERESIS)  # 多区域电子围栏（进入/离开/停留事件）
+exit_lead_time = LeadTimeEstimator(EXIT_LEAD_TIME)  # 预测离开事件的提前量
+world_state = WorldState()  # 每帧的世界状态快照（检测线程发布，控制循环等待下一帧）
+event_bus = EventBus()  # 检测线程 → 控制协程的事件总线（电子围栏事件），订阅者按toio编号和事件类型过滤
 video_stream_server_running = False
 
 class ToioController:
@@ -52,6 +140,8 @@ class ToioController:
         self.state_event = asyncio.Event()
         self.last_detected_time = time.time()  # 添加最后检测时间
         self.is_detected = False  # 添加检测状态标志
+        self.trigger_time = None  # 触发特殊动作的画面采集时间，用于测量采集→BLE命令延迟
+        self.snapshot_seq = 0  # 最近处理的世界状态快照序号
         
     async def random_move(self):
         """随机移动 - 每个ID有不同的移动特性"""
@@ -93,6 +183,12 @@ class ToioController:
             if "Not connected" not in str(e) and "Unreachable" not in str(e):
                 print(f"⚠️  Toio {self.id}: 移动命令失败 - {e}")
         
+    def record_trigger_latency(self):
+        """特殊动作的第一条电机命令发出后，记录从画面采集到命令发出的延迟"""
+        if self.trigger_time is not None:
+            exit_lead_time.record(time.time() - self.trigger_time)
+            self.trigger_time = None
+
     async def special_move(self):
         """特殊移动：原地转，然后前进"""
         try:
@@ -100,6 +196,7 @@ class ToioController:
             
             # 原地转180度（0.5秒）
             await self.cube.api.motor.motor_control(left=30, right=-30)
+            self.record_trigger_latency()
             await asyncio.sleep(0.5)
             
             # 向前移动1秒
@@ -204,11 +301,26 @@ class ToioController:
             self.state = "random"
             print(f"↩️ Toio {self.id}: 搜索动作结束，恢复随机状态")
             
+    def apply_snapshot(self, snapshot):
+        """用本帧的世界状态快照更新检测状态（在事件循环线程中调用）"""
+        self.update_detection_status(self.id in snapshot.cubes)
+
+    async def pause(self, duration):
+        """等待 duration 秒，期间状态发生变化时立即返回"""
+        try:
+            await asyncio.wait_for(self.state_event.wait(), duration)
+        except asyncio.TimeoutError:
+            pass
+
     async def control_loop(self):
         """主控制循环"""
         try:
             while True:
                 try:
+                    # 等待下一帧的世界状态（检测状态已由快照在事件循环中更新）
+                    snapshot = await world_state.next(self.snapshot_seq, CONTROL_SNAPSHOT_TIMEOUT)
+                    self.snapshot_seq = snapshot.seq
+                    
                     # 检查检测状态
                     await self.handle_detection_lost()
                     
@@ -217,20 +329,19 @@ class ToioController:
                         
                         # 根据ID设置不同的等待时间
                         if self.id == 0:  # ID 0: 快速反应
-                            await asyncio.sleep(random.uniform(0.1, 0.2))
+                            await self.pause(random.uniform(0.1, 0.2))
                         elif self.id == 1:  # ID 1: 中等节奏
-                            await asyncio.sleep(random.uniform(0.2, 0.3))
+                            await self.pause(random.uniform(0.2, 0.3))
                         elif self.id == 2:  # ID 2: 缓慢节奏
-                            await asyncio.sleep(random.uniform(0.3, 0.4))
+                            await self.pause(random.uniform(0.3, 0.4))
                         else:
-                            await asyncio.sleep(random.uniform(0.4, 0.5))
+                            await self.pause(random.uniform(0.4, 0.5))
                             
                     elif self.state == "special" and self.is_detected:
                         await self.special_move()
                     elif self.state == "search" and not self.is_detected:
                         await self.search_move()
-                    else:
-                        await asyncio.sleep(0.1)  # 未检测到时的等待时间
+                    # 其他情况：等待下一帧快照
                         
                     if self.state_event.is_set():
                         self.state_event.clear()
@@ -292,34 +403,54 @@ class CombinedController:
                 print(f"⚠️  Toio {i} 初始化失败: {e}")
                 # 继续初始化其他toio
             
+    def apply_snapshot(self, snapshot):
+        """世界状态快照的监听器：在事件循环线程中更新所有toio的检测状态"""
+        for controller in self.controllers.values():
+            controller.apply_snapshot(snapshot)
+    
     async def event_handler(self):
-        """处理来自YOLO的离开圆圈事件"""
-        while self.running:
-            try:
-                # 非阻塞地检查队列
-                try:
-                    toio_id = exit_event_queue.get_nowait()
-                    
-                    # 将YOLO的ID转换为toio的ID（0,1,2）
-                    if toio_id in ['0', '1', '2']:
-                        toio_index = int(toio_id)
-                        if toio_index in self.controllers:
-                            controller = self.controllers[toio_index]
-                            # 只有在random状态时才触发特殊动作，避免重复触发
-                            if controller.state == "random":
-                                controller.state = "special"
-                                controller.state_event.set()
-                                print(f"✅ 触发Toio {toio_index}的特殊动作")
-                            else:
-                                print(f"⚠️  Toio {toio_index}忽略重复的离开圆圈事件（当前状态：{controller.state}）")
-                            
-                except queue.Empty:
-                    pass
-                    
-                await asyncio.sleep(0.1)
-                
-            except asyncio.CancelledError:
-                break
+        """处理来自YOLO的离开圆圈事件（事件总线推送，无需轮询）"""
+        # 只处理toio的ID（0,1,2）离开或预计离开 EXIT_ZONE 的事件
+        subscription = event_bus.subscribe(cube_ids=TOIO_IDS, kinds=('exit', 'pre_exit'))
+        try:
+            async for event in subscription:
+                if event.zone != EXIT_ZONE or event.cube_id not in self.controllers:
+                    continue
+                controller = self.controllers[event.cube_id]
+                # 只有在random状态时才触发特殊动作，避免重复触发
+                if controller.state == "random":
+                    controller.state = "special"
+                    controller.trigger_time = event.timestamp
+                    controller.state_event.set()
+                    print(f"✅ 触发Toio {event.cube_id}的特殊动作")
+                else:
+                    print(f"⚠️  Toio {event.cube_id}忽略重复的离开圆圈事件（当前状态：{controller.state}）")
+        except asyncio.CancelledError:
+            pass
+        finally:
+            subscription.close()
+    
+    async def event_logger(self):
+        """打印所有电子围栏事件（事件总线的另一个订阅者）"""
+        subscription = event_bus.subscribe()
+        try:
+            async for event in subscription:
+                if event.zone == EXIT_ZONE and event.kind == 'exit':
+                    print(f"⚠️  检测到: ID:{event.cube_id} 离开了圆圈！")
+                elif event.zone == EXIT_ZONE and event.kind == 'pre_exit':
+                    print(f"⏩ 预计 ID:{event.cube_id} 在 {event.time_to_exit:.2f}s 后离开圆圈，提前触发")
+                elif event.zone == EXIT_ZONE:
+                    continue
+                elif event.kind == 'enter':
+                    print(f"📍 ID:{event.cube_id} 进入区域 {event.zone}")
+                elif event.kind == 'exit':
+                    print(f"📍 ID:{event.cube_id} 离开区域 {event.zone}（停留 {event.dwell:.1f}s）")
+                elif event.kind == 'dwell':
+                    print(f"⏱️  ID:{event.cube_id} 在区域 {event.zone} 停留 {event.dwell:.1f}s")
+        except asyncio.CancelledError:
+            pass
+        finally:
+            subscription.close()
                 
     def start_yolo_detection(self):
         """在单独的线程中运行YOLO检测"""
@@ -329,9 +460,16 @@ class CombinedController:
         
     async def run(self):
         """运行主程序"""
+        event_bus.attach()  # 检测线程发布的事件投递到当前事件循环
+        world_state.attach()
+        world_state.add_listener(self.apply_snapshot)
         print("=== YOLO + Toio 联合控制系统 ===")
         print("正在初始化系统...")
         
+        # 在连接toio的同时加载模型、预热并打开摄像头
+        print("🔧 后台准备YOLO检测系统（与蓝牙连接并行）...")
+        vision_ready = asyncio.get_running_loop().run_in_executor(None, prepare_yolo_detection)
+        
         # 连接toio设备 - 添加重试机制
         max_retries = 3
         retry_count = 0
@@ -340,13 +478,25 @@ class CombinedController:
             try:
                 print(f"\n尝试连接toio设备... (第{retry_count + 1}次)")
                 
+                connect_start = time.perf_counter()
                 async with MultipleToioCoreCubes(cubes=3, names=["0", "1", "2"]) as cubes:
+                    startup_timer.record('蓝牙连接', time.perf_counter() - connect_start)
                     print("✅ 成功连接3个toio设备！")
                     
                     await asyncio.sleep(2)
-                    await self.initialize_toio(cubes)
+                    with startup_timer.phase('toio初始化'):
+                        await self.initialize_toio(cubes)
+                    
+                    # 就绪屏障：toio和视觉系统都准备好后才启动YOLO检测线程
+                    if not vision_ready.done():
+                        print("⏳ 等待YOLO检测系统就绪...")
+                    with startup_timer.phase('等待视觉就绪'):
+                        vision_ok = await vision_ready
+                    if not vision_ok:
+                        print("❌ YOLO检测系统准备失败，程序退出")
+                        self.running = False
+                        break
                     
-                    # 在toio初始化成功后启动YOLO检测线程
                     print("🔧 正在启动YOLO检测系统...")
                     self.start_yolo_detection()
                     print("✅ YOLO检测系统启动成功！")
@@ -361,8 +511,10 @@ class CombinedController:
                     # 事件处理任务
                     event_task = asyncio.create_task(self.event_handler())
                     tasks.append(event_task)
+                    tasks.append(asyncio.create_task(self.event_logger()))
                     
                     print("✅ 系统启动完成！")
+                    startup_timer.report()
                     print("📷 YOLO检测已启动，当机器人离开圆圈时会自动执行特殊动作")
                     print("按 'q' 键退出程序")
                     
@@ -424,28 +576,68 @@ class CombinedController:
 # ========== YOLO检测相关函数 ==========
 
 def initialize_model():
-    """初始化YOLO模型"""
-    global model
+    """初始化YOLO模型（优先在独立推理进程中加载）"""
+    global model, inference_process, INFERENCE_BACKEND, INPUT_SIZE
     try:
-        print("🔧 正在加载YOLO模型...")
-        model = YOLO(MODEL_PATH)
+        # 本机调优结果（tune_inference.py）优先于代码中的默认配置
+        torch_threads = cpu_cores = None
+        profile = load_profile(INFERENCE_PROFILE_PATH, MODEL_PATH)
+        tuned = profile.get('inference') if profile else None
+        if tuned:
+            INFERENCE_BACKEND = tuned['backend']
+            INPUT_SIZE = tuned['imgsz']
+            torch_threads = tuned.get('torch_threads')
+            cpu_cores = tuned.get('cpu_cores')
+            print(f"📋 已加载性能配置: 后端 {INFERENCE_BACKEND}，推理尺寸 {INPUT_SIZE}，torch线程 {torch_threads}")
         
-        try:
-            import torch
-            device = 'cuda' if torch.cuda.is_available() else 'cpu'
-            print(f"✅ 使用设备: {device}")
-        except:
-            device = 'cpu'
-        
-        model.overrides.update({
+        # 设备在加载模型的进程中自动选择，主进程无需导入torch
+        overrides = {
             'verbose': False,
-            'device': device,
+            'device': 'auto',
             'half': False,
             'agnostic_nms': True,
             'max_det': 50,
-        })
+        }
+        
+        if USE_INFERENCE_PROCESS:
+            predict_args = {'imgsz': INPUT_SIZE, 'conf': CONF_THRESHOLD, 'verbose': False}
+            if INFERENCE_WORKERS > 1:
+                print(f"🔧 正在启动YOLO推理进程池（{INFERENCE_WORKERS} 个进程）...")
+                inference_process = InferenceWorkerPool(
+                    MODEL_PATH,
+                    overrides,
+                    predict_args,
+                    workers=INFERENCE_WORKERS,
+                    backend=INFERENCE_BACKEND,
+                    # 调优结果是单个进程的配置：核心和torch线程在各进程之间平分
+                    threads_per_worker=max(1, torch_threads // INFERENCE_WORKERS) if torch_threads else None,
+                    max_latency=INFERENCE_MAX_LATENCY,
+                    cpu_cores=cpu_cores,
+                )
+            else:
+                print("🔧 正在启动YOLO推理进程...")
+                inference_process = InferenceProcess(
+                    MODEL_PATH,
+                    overrides,
+                    predict_args,
+                    slots=INFERENCE_RING_SLOTS,
+                    backend=INFERENCE_BACKEND,
+                    torch_threads=torch_threads,
+                    cpu_cores=cpu_cores,
+                )
+            if inference_process.start():
+                print("✅ YOLO模型加载成功！（独立推理进程）")
+                return True
+            inference_process = None
+            print("⚠️  推理进程启动失败，改为在当前进程中加载模型")
         
-        print("✅ YOLO模型加载成功！")
+        print("🔧 正在加载YOLO模型...")
+        if torch_threads:
+            # 进程内推理只限制torch线程数，不绑定核心（避免影响蓝牙和推流线程）
+            pin_inference_threads(torch_threads, None)
+        model, backend = load_inference_model(MODEL_PATH, INFERENCE_BACKEND, INPUT_SIZE, overrides)
+        
+        print(f"✅ YOLO模型加载成功！（后端: {backend}，设备: {model.overrides['device']}）")
         return True
         
     except Exception as e:
@@ -453,8 +645,14 @@ def initialize_model():
         return False
 
 def initialize_camera():
-    """初始化摄像头"""
-    global cap
+    """初始化摄像头，并启动独立的采集线程"""
+    global cap, frame_capture, CAMERA_WIDTH, CAMERA_HEIGHT, CAMERA_FPS
+    
+    profile = load_profile(INFERENCE_PROFILE_PATH)
+    if profile and profile.get('camera'):
+        CAMERA_WIDTH = profile['camera'].get('width', CAMERA_WIDTH)
+        CAMERA_HEIGHT = profile['camera'].get('height', CAMERA_HEIGHT)
+        CAMERA_FPS = profile['camera'].get('fps', CAMERA_FPS)
     
     print("🎥 正在初始化摄像头...")
     
@@ -463,13 +661,14 @@ def initialize_camera():
     for backend in backends:
         cap = cv2.VideoCapture(CAMERA_INDEX, backend)
         if cap.isOpened():
-            cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-            cap.set(cv2.CAP_PROP_FPS, 30)
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
+            cap.set(cv2.CAP_PROP_FPS, CAMERA_FPS)
             cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
             
             ret, frame = cap.read()
             if ret and frame is not None:
+                frame_capture = LatestFrameCapture(cap).start()
                 print(f"✅ 摄像头初始化成功！")
                 return True
             else:
@@ -478,170 +677,233 @@ def initialize_camera():
     print(f"❌ 摄像头初始化失败！")
     return False
 
-def detect_objects(frame):
-    """目标检测函数"""
+def warm_up_model():
+    """用空白画面预热模型，避免第一帧真实画面推理特别慢"""
+    dummy_frame = np.zeros((CAMERA_HEIGHT, CAMERA_WIDTH, 3), dtype=np.uint8)
+    start_time = time.time()
+    if isinstance(inference_process, InferenceWorkerPool):
+        # 进程池按轮转分发，逐帧预热只会覆盖部分进程：每个进程各推理一次
+        if not inference_process.warm_up(dummy_frame, WARMUP_RUNS):
+            print("⚠️  部分推理进程预热失败")
+    else:
+        for _ in range(WARMUP_RUNS):
+            detect_objects(dummy_frame)
+    print(f"🔥 模型预热完成（{time.time() - start_time:.1f}秒）")
+    return True
+
+def prepare_yolo_detection():
+    """并行加载模型（含预热）和打开摄像头，两者都成功时返回True"""
+    global yolo_ready
+    
+    if yolo_ready:
+        return True
+    
+    def open_camera():
+        with startup_timer.phase('摄像头'):
+            camera_result['ok'] = initialize_camera()
+    
+    camera_result = {}
+    camera_thread = Thread(target=open_camera, daemon=True)
+    camera_thread.start()
+    
+    with startup_timer.phase('模型加载'):
+        model_ok = initialize_model()
+    if model_ok:
+        with startup_timer.phase('模型预热'):
+            model_ok = warm_up_model()
+    camera_thread.join()
+    
+    yolo_ready = model_ok and camera_result.get('ok', False)
+    if not yolo_ready:
+        release_yolo_resources()
+    return yolo_ready
+
+def release_yolo_resources():
+    """释放推理进程和摄像头（可重复调用）"""
+    global inference_process, frame_capture, cap, yolo_ready
+    
+    yolo_ready = False
+    if inference_process is not None:
+        inference_process.stop()
+        inference_process = None
+    for buffer, _ in pipeline_frames.values():
+        buffer.release()
+    pipeline_frames.clear()
+    if frame_capture is not None:
+        frame_capture.stop()
+        frame_capture = None
+    elif cap is not None:
+        cap.release()
+    cap = None
+
+def predict_obb(frame, imgsz=None):
+    """执行推理，返回 N×7 的检测数组 (cx, cy, w, h, angle, conf, class_id)"""
+    imgsz = imgsz or INPUT_SIZE
+    if inference_process is not None:
+        # 推理进程超时或没有空闲槽位时本帧按无检测处理，不中断检测流程
+        detections = inference_process.infer(frame, imgsz=imgsz)
+        return EMPTY_DETECTIONS if detections is None else detections
+    
+    results = model.predict(
+        source=np.ascontiguousarray(frame),
+        imgsz=imgsz,
+        conf=CONF_THRESHOLD,
+        verbose=False
+    )
+    return results_to_array(results)
+
+def predict_obb_batch(frames, imgsz=None):
+    """整批推理尺寸相同的多张画面（切片），返回与输入一一对应的 N×7 检测数组列表"""
+    imgsz = imgsz or INPUT_SIZE
+    if inference_process is not None:
+        return inference_process.infer_batch(frames, imgsz=imgsz) or [EMPTY_DETECTIONS] * len(frames)
+    
+    results = model.predict(
+        source=[np.ascontiguousarray(frame) for frame in frames],
+        imgsz=imgsz,
+        conf=CONF_THRESHOLD,
+        verbose=False
+    )
+    return [results_to_array([r]) for r in results]
+
+def select_inference_roi(frame_shape):
+    """按 ROI_MODE 选择本帧的推理区域"""
+    expected_ids = tuple(controller.controllers) if controller else ()
+    return select_roi(
+        ROI_MODE, frame_shape, (CIRCLE_CENTER_X, CIRCLE_CENTER_Y, CIRCLE_RADIUS), ROI_MARGIN,
+        tracker.last_output, expected_ids,
+    )
+
+def detect_objects(frame, roi=None):
+    """目标检测函数，返回列式检测批次（见 detection_batch.DETECTION_DTYPE）
+
+    roi 为 (x0, y0, x1, y1) 时只在该区域推理，否则按 ROI_MODE 自动选择区域。
+    """
     global model
     
-    if model is None:
-        return []
+    if model is None and inference_process is None:
+        return EMPTY_BATCH
     
     try:
-        results = model.predict(
-            source=frame,
-            imgsz=INPUT_SIZE,
-            conf=CONF_THRESHOLD,
-            verbose=False
-        )
+        # 只对ROI区域推理：区域越小推理尺寸越小，检测结果再平移回整帧坐标
+        if roi is None:
+            roi = select_inference_roi(frame.shape)
+        x0, y0, x1, y1 = roi
         
-        detections = []
+        # 高分辨率画面：区域切成重叠切片整批推理，跨切片的旋转框用NMS合并
+        if USE_TILED_INFERENCE and max(x1 - x0, y1 - y0) > TILE_SIZE:
+            imgsz = min(TILE_SIZE, scheduler.imgsz)
+            return from_array(predict_tiled(frame, roi, TILE_SIZE, lambda tiles: predict_obb_batch(tiles, imgsz)))
         
-        for r in results:
-            if r.obb is not None and len(r.obb.data) > 0:
-                for detection in r.obb.data:
-                    try:
-                        det_data = detection.cpu().numpy()
-                        center_x = float(det_data[0])
-                        center_y = float(det_data[1])
-                        width = float(det_data[2])
-                        height = float(det_data[3])
-                        angle = float(det_data[4])
-                        confidence = float(det_data[5])
-                        class_id = int(det_data[6])
-                        
-                        # ID映射
-                        output_id = str(class_id)
-                        if class_id == 3:
-                            output_id = "0"
-                        elif class_id == 0:
-                            output_id = "3"
-                        
-                        detection_result = {
-                            "id": output_id,
-                            "center_x": center_x,
-                            "center_y": center_y,
-                            "width": width,
-                            "height": height,
-                            "angle": angle,
-                            "confidence": confidence,
-                            "class_id": class_id
-                        }
-                        
-                        detections.append(detection_result)
-                        
-                    except Exception as e:
-                        continue
+        imgsz = roi_input_size((x0, y0, x1, y1), min(INPUT_SIZE, scheduler.imgsz))
+        det_array = predict_obb(frame[y0:y1, x0:x1], imgsz)
         
-        return detections
+        # 一次性把检测结果转换为批次，类别ID通过查找表映射为toio编号
+        return from_array(offset_detections(det_array, x0, y0))
         
     except Exception as e:
         print(f"❌ 检测错误: {e}")
-        return []
+        return EMPTY_BATCH
+
+def redetect_lost_cubes(frame, frame_time, detections):
+    """对本帧未检测到的toio，在其最后已知/预测位置附近做小窗口高分辨率检测并合并结果"""
+    expected_ids = tuple(controller.controllers) if controller else ()
+    half = REDETECT_WINDOW / 2
+    windows = []
+    for cube_id in expected_ids:
+        if np.any(detections['cube_id'] == cube_id):
+            continue
+        track = tracker.get_track(cube_id)
+        if track is None:
+            continue
+        cx, cy = track.expected_position(frame_time, TRACK_MAX_COAST_TIME)
+        window = clip_roi((cx - half, cy - half, cx + half, cy + half), frame.shape)
+        windows.append(align_roi(window, frame.shape))
+    
+    if not windows:
+        return detections
+    
+    try:
+        crops = [frame[y0:y1, x0:x1] for x0, y0, x1, y1 in windows]
+        found = from_array(rotated_nms(merge_tile_detections(predict_obb_batch(crops, REDETECT_IMGSZ), windows)))
+    except Exception as e:
+        print(f"❌ 重新检测错误: {e}")
+        return detections
+    
+    # 主检测已经找到的编号不重复添加
+    found = found[~np.isin(found['cube_id'], detections['cube_id'])]
+    if len(found) == 0:
+        return detections
+    return np.concatenate([detections, found])
+
+def submit_pipelined(buffer, seq, frame_time):
+    """流水线模式：按ROI裁剪后提交给推理进程池，不等待结果（所有进程繁忙时丢弃该帧）
+
+    提交成功时流水线持有该帧的一个引用，直到结果返回后交给调用者。
+    """
+    frame = buffer.array
+    x0, y0, x1, y1 = roi = select_inference_roi(frame.shape)
+    imgsz = roi_input_size(roi, min(INPUT_SIZE, scheduler.imgsz))
+    if inference_process.submit(frame[y0:y1, x0:x1], seq, frame_time, imgsz):
+        pipeline_frames[seq] = (buffer.retain(), roi)
+
+def collect_pipelined(timeout):
+    """按帧序号顺序取回流水线结果 [(画面, 采集时间, 检测批次)]，返回的画面由调用者释放"""
+    completed = []
+    for seq, frame_time, det_array, _ in inference_process.get_results(timeout):
+        frame, (x0, y0, _, _) = pipeline_frames.pop(seq)
+        completed.append((frame, frame_time, from_array(offset_detections(det_array, x0, y0))))
+    
+    # 清理因超时被进程池丢弃的帧
+    for seq in [s for s in pipeline_frames if not inference_process.outstanding(s)]:
+        pipeline_frames.pop(seq)[0].release()
+    return completed
 
 def is_target_in_circle(center_x, center_y):
     """检查目标是否在圆圈内"""
     distance = np.sqrt((center_x - CIRCLE_CENTER_X)**2 + (center_y - CIRCLE_CENTER_Y)**2)
     return distance <= CIRCLE_RADIUS
 
-def check_circle_exit(object_id, center_x, center_y):
-    """检查目标是否离开圆圈并发送事件"""
-    global target_status
-    
-    current_in_circle = is_target_in_circle(center_x, center_y)
-    
-    if object_id not in target_status:
-        target_status[object_id] = current_in_circle
-        return
-    
-    previous_in_circle = target_status[object_id]
-    
-    # 检测到从圆圈内移动到圆圈外
-    if previous_in_circle and not current_in_circle:
-        print(f"⚠️  检测到: ID:{object_id} 离开了圆圈！")
-        # 将事件放入队列
-        exit_event_queue.put(object_id)
-    
-    target_status[object_id] = current_in_circle
+def handle_geofence_events(events):
+    """把电子围栏事件发布到事件总线（离开 EXIT_ZONE 时由 event_handler 触发特殊动作）"""
+    for event in events:
+        event_bus.publish(event)
 
-def draw_detections(frame, detections):
-    """在画面上绘制检测结果"""
-    
-    # 更新所有toio的检测状态为未检测
-    if controller:
-        for toio_controller in controller.controllers.values():
-            toio_controller.update_detection_status(False)
-    
-    # 绘制大圆圈
-    cv2.circle(frame, (CIRCLE_CENTER_X, CIRCLE_CENTER_Y), CIRCLE_RADIUS, CIRCLE_COLOR, CIRCLE_THICKNESS)
-    cv2.circle(frame, (CIRCLE_CENTER_X, CIRCLE_CENTER_Y), 3, CIRCLE_COLOR, -1)
+def update_detection_state(detections, frame_shape, timestamp):
+    """根据本帧的跟踪结果更新电子围栏并发布世界状态快照
+
+    检测线程不直接修改控制器：toio的检测状态由快照在事件循环中更新。
+    返回每个目标是否在 EXIT_ZONE 内（经过滞回，与 detections 一一对应）。
+    """
+    # 电子围栏只使用实际检测到的位置（预测位姿不触发区域事件）
+    cube_ids = detections['cube_id']
+    measured = ~detections['coasting']
+    _, events = geofence.update(
+        cube_ids[measured], detections['center_x'][measured], detections['center_y'][measured], timestamp, frame_shape
+    )
+    if USE_PREDICTIVE_EXIT:
+        # 按跟踪速度外推一个采集→BLE延迟，预计会越过边界的toio提前触发
+        tracks = detections[measured]
+        events += geofence.predict_exits(
+            tracks['cube_id'], tracks['center_x'], tracks['center_y'],
+            tracks['velocity_x'], tracks['velocity_y'], exit_lead_time.lead_time, timestamp
+        )
+    handle_geofence_events(events)
     
-    for det in detections:
-        object_id = det['id']
-        if object_id not in ['0', '1', '2', '3']:
-            continue
-            
-        center_x = int(det['center_x'])
-        center_y = int(det['center_y'])
-        width = det['width']
-        height = det['height']
-        angle = det['angle']
-        
-        # 更新检测状态
-        if controller and object_id in ['0', '1', '2']:
-            toio_id = int(object_id)
-            if toio_id in controller.controllers:
-                controller.controllers[toio_id].update_detection_status(True)
-        
-        # 检查是否离开圆圈
-        check_circle_exit(object_id, center_x, center_y)
-        
-        # 根据位置选择颜色
-        in_circle = is_target_in_circle(center_x, center_y)
-        center_color = (0, 255, 0) if in_circle else (0, 0, 255)
-        box_color = (255, 0, 0) if in_circle else (0, 0, 255)
-        
-        # 绘制中心点
-        cv2.circle(frame, (center_x, center_y), 2, center_color, -1)
-        
-        # 绘制旋转矩形框
-        try:
-            cos_a = np.cos(np.radians(angle))
-            sin_a = np.sin(np.radians(angle))
-            
-            w_half = width / 2
-            h_half = height / 2
-            
-            corners = np.array([
-                [-w_half, -h_half],
-                [w_half, -h_half],
-                [w_half, h_half],
-                [-w_half, h_half]
-            ])
-            
-            rotation_matrix = np.array([
-                [cos_a, -sin_a],
-                [sin_a, cos_a]
-            ])
-            
-            rotated_corners = corners @ rotation_matrix.T
-            rotated_corners[:, 0] += center_x
-            rotated_corners[:, 1] += center_y
-            
-            points = rotated_corners.astype(int)
-            cv2.polylines(frame, [points], True, box_color, 1)
-            
-        except Exception:
-            pass
-        
-        # 绘制ID标签
-        label = f"ID:{object_id}"
-        cv2.putText(frame, label, (center_x + 10, center_y - 10), 
-                   cv2.FONT_HERSHEY_DUPLEX, 0.35, (0, 255, 255), 1, cv2.LINE_AA)
+    zone_ids = geofence.current_zones(cube_ids.tolist())
+    world_state.publish_tracks(timestamp, detections, [geofence.zone_name(z) for z in zone_ids.tolist()])
+    return zone_ids == geofence.zone_id(EXIT_ZONE)
+
+def draw_detections(renderer, frame, detections, in_circle):
+    """在画面上绘制检测结果（静态内容 + 整批绘制的旋转框）"""
+    renderer.draw_static(frame)
+    renderer.draw_tracks(frame, detections, in_circle)
 
 def run_yolo_detection(is_running):
     """YOLO检测主循环（在单独线程中运行）"""
-    global cap, video_stream_server_running
+    global video_stream_server_running
     
-    if not initialize_model() or not initialize_camera():
+    if not prepare_yolo_detection():
         print("❌ YOLO初始化失败")
         return
 
@@ -650,10 +912,15 @@ def run_yolo_detection(is_running):
         try:
             import threading
             server_thread = threading.Thread(
-                target=start_server, 
+                target=video_stream_server.start_server, 
                 args=('localhost', 5000, False),
                 daemon=True
             )
+            video_stream_server.set_stop_handler(lambda: request_stop("收到 /stop 请求"))
+            video_stream_server.subscribe_events(event_bus)
+            video_stream_server.set_frame_pool_stats(
+                lambda: frame_capture.pool.get_stats() if frame_capture is not None else None
+            )
             server_thread.start()
             video_stream_server_running = True
             print("🎥 视频流服务器已启动在 http://localhost:5000")
@@ -661,19 +928,52 @@ def run_yolo_detection(is_running):
         except Exception as e:
             print(f"⚠️  视频流服务器启动失败: {e}")
     
-    cv2.namedWindow("YOLO Detection", cv2.WINDOW_NORMAL)
-    cv2.resizeWindow("YOLO Detection", 1000, 750)
+    preview = None
+    if not HEADLESS:
+        preview = PreviewWindow("YOLO Detection", (1000, 750), PREVIEW_MAX_FPS, on_quit=lambda: request_stop("预览窗口按下 q")).start()
+    
+    # 圆圈、操作说明、视频流地址等不变的内容只生成一次绘制命令
+    renderer = OverlayRenderer((CIRCLE_CENTER_X, CIRCLE_CENTER_Y, CIRCLE_RADIUS), CIRCLE_COLOR, CIRCLE_THICKNESS)
+    static_lines = [("Stop: Ctrl+C or POST /stop" if HEADLESS else "Press 'q' to quit", (10, 75), 0.5, (255, 255, 255))]
+    if VIDEO_STREAM_AVAILABLE:
+        static_lines.append(("Stream: http://localhost:5000/video_feed", (10, 100), 0.5, (255, 200, 0)))
+    renderer.set_static_text(static_lines)
     
     frame_count = 0
     fps_start_time = time.time()
     fps = 0
+    last_seq = 0
+    change_gate = ChangeGate(detect_objects) if USE_CHANGE_GATE else None
+    detect = change_gate.detect if change_gate is not None else detect_objects
+    sparse_detector = SparseDetector(detect, KEYFRAME_INTERVAL) if USE_SPARSE_INFERENCE else None
+    # 多进程流水线：每帧只提交不等待，结果按帧序号顺序返回（稀疏推理、变化门控、重新检测需要逐帧同步结果，此模式下不启用）
+    pipelined = isinstance(inference_process, InferenceWorkerPool)
+    completed = []
     
     try:
+        held = None  # 本轮循环持有的画面引用（PooledFrame），下一轮开始时释放
         while is_running():
-            ret, frame = cap.read()
+            release_frame(held)
+            held = None
+            # 从采集线程取最新帧，推理期间积压的旧帧已被丢弃
+            ret, held, frame_time, last_seq = frame_capture.read_latest(last_seq)
             if not ret:
                 continue
             
+            if pipelined:
+                submit_pipelined(held, last_seq, frame_time)
+                completed = collect_pipelined(0.005)
+                if not completed:
+                    continue
+                # 显示最新完成的那一帧及其检测结果，其余完成帧只用于更新跟踪
+                for buffer, _, _ in completed[:-1]:
+                    buffer.release()
+                submitted = held
+                held, frame_time = completed[-1][:2]
+                submitted.release()
+            # 叠加层直接画在采集缓冲区上，不再另外复制画面
+            frame = held.array
+            
             frame_count += 1
             current_time = time.time()
             
@@ -681,58 +981,88 @@ def run_yolo_detection(is_running):
                 fps = 30 / (current_time - fps_start_time)
                 fps_start_time = current_time
             
-            # 执行检测
-            detections = detect_objects(frame)
+            # 执行检测（稀疏推理模式下非关键帧用光流传播），再交给跟踪器关联编号、平滑位置
+            if pipelined:
+                for _, result_time, raw_detections in completed:
+                    detections = tracker.update(raw_detections, result_time)
+                    scheduler.record_latency(time.time() - result_time)
+            elif scheduler.should_infer():
+                if sparse_detector is not None:
+                    raw_detections, _ = sparse_detector.process(frame)
+                else:
+                    raw_detections = detect(frame)
+                # 可选检测：丢失的toio在其附近做高分辨率小窗口检测（负载高时由调度器关闭）
+                if USE_REDETECTION and scheduler.optional_passes:
+                    raw_detections = redetect_lost_cubes(frame, frame_time, raw_detections)
+                detections = tracker.update(raw_detections, frame_time)
+                scheduler.record_latency(time.time() - frame_time)
+            else:
+                # 调度器降低了推理频率：本帧只输出跟踪器的预测位姿
+                if sparse_detector is not None:
+                    sparse_detector.track(frame)  # 光流仍逐帧跟踪，避免下一次跨越多帧运动
+                detections = tracker.update(EMPTY_BATCH, frame_time)
             
-            # 绘制结果
-            draw_detections(frame, detections)
+            # 所有目标静止、toio都在正常状态且无人观看视频流时，降到低功耗帧率
+            moving = bool(np.any(detections['speed'] > IDLE_SPEED))
+            busy = controller is not None and any(c.state != "random" for c in controller.controllers.values())
+            clients = video_stream_server.get_client_count() if video_stream_server_running else 0
+            scheduler.update_activity(moving or busy, clients)
             
-            # 显示FPS等信息
-            cv2.putText(frame, f"FPS: {fps:.1f}", (10, 25), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1, cv2.LINE_AA)
-            cv2.putText(frame, f"Objects: {len(detections)}", (10, 50), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1, cv2.LINE_AA)
-            cv2.putText(frame, "Press 'q' to quit", (10, 75), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
+            # 先更新电子围栏并发布本帧快照，再绘制（绘制只读取状态）
+            detections = select_ids(detections)
+            in_circle = update_detection_state(detections, frame.shape, frame_time)
+            draw_detections(renderer, frame, detections, in_circle)
             
-            # 添加视频流状态信息
-            if VIDEO_STREAM_AVAILABLE:
-                cv2.putText(frame, "Stream: http://localhost:5000/video_feed", (10, 100), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 200, 0), 1, cv2.LINE_AA)
+            objects_text = f"Objects: {len(detections)}  imgsz: {scheduler.imgsz}  1/{scheduler.interval}"
+            if scheduler.low_power:
+                objects_text += "  [low power]"
+            if sparse_detector is not None:
+                objects_text += f"  Keyframe: 1/{sparse_detector.interval}"
+            if change_gate is not None:
+                objects_text += f"  Skipped: {change_gate.skipped}"
+            renderer.draw_hud(frame, [
+                (f"FPS: {fps:.1f}  Dropped: {frame_capture.dropped_frames}", (10, 25), 0.5, (0, 255, 0)),
+                (objects_text, (10, 50), 0.5, (0, 255, 255)),
+            ])
             
             # 发送画面到视频流服务器
             if VIDEO_STREAM_AVAILABLE:
                 try:
-                    update_detection_frame(frame)
+                    video_stream_server.update_detection_frame(held)
+                    video_stream_server.update_detections(detections, last_seq, frame_time)
                 except Exception as e:
                     pass  # 静默处理流服务器错误
             
-            cv2.imshow("YOLO Detection", frame)
+            # 预览线程按限定刷新率显示，检测线程不等待窗口绘制
+            if preview is not None:
+                preview.show(held)
             
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord('q'):
-                # 通知主程序退出
-                controller.running = False
-                break
+            delay = scheduler.frame_delay(current_time)
+            if delay > 0:
+                time.sleep(delay)
                 
     except Exception as e:
         print(f"❌ YOLO检测错误: {e}")
     finally:
-        if cap is not None:
-            cap.release()
-        cv2.destroyAllWindows()
+        if preview is not None:
+            preview.stop()
+        release_frame(held)
+        release_yolo_resources()
 
 # ========== 主程序入口 ==========
 
 controller = None  # 全局控制器实例
 
-def signal_handler(signum, frame):
-    """处理Ctrl+C信号"""
-    global controller
-    print("\n\n⚠️  收到退出信号，正在安全关闭程序...")
+def request_stop(reason="收到退出信号"):
+    """请求安全退出（Ctrl+C / SIGTERM、预览窗口按 q、POST /stop 共用）"""
+    print(f"\n\n⚠️  {reason}，正在安全关闭程序...")
     if controller:
         controller.running = False
 
+def signal_handler(signum, frame):
+    """处理Ctrl+C / SIGTERM信号"""
+    request_stop()
+
 async def main():
     """主程序入口"""
     global controller
@@ -740,6 +1070,8 @@ async def main():
     # 设置信号处理
     import signal
     signal.signal(signal.SIGINT, signal_handler)
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, signal_handler)
     
     controller = CombinedController()
     
@@ -749,6 +1081,9 @@ async def main():
         print(f"主程序错误: {e}")
     finally:
         controller.running = False
+        if controller.yolo_thread is not None:
+            controller.yolo_thread.join(timeout=3.0)
+        release_yolo_resources()
         print("\n程序已退出")
 
 if __name__ == "__main__":
@@ -0,0 +1,99 @@
+import json
+
+import numpy as np
+
+# 一帧检测结果的列式结构：每个字段一列，整批一次性从推理输出转换
+DETECTION_DTYPE = np.dtype([
+    ('center_x', np.float32),
+    ('center_y', np.float32),
+    ('width', np.float32),
+    ('height', np.float32),
+    ('angle', np.float32),
+    ('confidence', np.float32),
+    ('class_id', np.int16),
+    ('cube_id', np.int16),
+])
+
+# 跟踪结果：在检测字段之外附加速度、运动方向和是否为预测位姿（未检测到时的惯性外推）
+TRACK_DTYPE = np.dtype(DETECTION_DTYPE.descr + [
+    ('velocity_x', np.float32),
+    ('velocity_y', np.float32),
+    ('speed', np.float32),
+    ('heading', np.float32),
+    ('coasting', np.bool_),
+])
+
+# 模型类别ID → 输出ID 的查找表（类别3对应0号toio，类别0对应3号，其余不变）
+CLASS_TO_CUBE_ID = np.arange(256, dtype=np.int16)
+CLASS_TO_CUBE_ID[3] = 0
+CLASS_TO_CUBE_ID[0] = 3
+
+TOIO_IDS = (0, 1, 2)        # 受控制的toio编号
+DRAWN_IDS = (0, 1, 2, 3)    # 画面上需要显示/监控的目标编号
+
+EMPTY_BATCH = np.zeros(0, dtype=DETECTION_DTYPE)
+EMPTY_TRACKS = np.zeros(0, dtype=TRACK_DTYPE)
+
+
+def from_array(det_array):
+    """把 N×7 的推理输出 (cx, cy, w, h, angle, conf, class_id) 转换为检测批次"""
+    if det_array is None or len(det_array) == 0:
+        return EMPTY_BATCH
+
+    batch = np.empty(len(det_array), dtype=DETECTION_DTYPE)
+    batch['center_x'] = det_array[:, 0]
+    batch['center_y'] = det_array[:, 1]
+    batch['width'] = det_array[:, 2]
+    batch['height'] = det_array[:, 3]
+    batch['angle'] = det_array[:, 4]
+    batch['confidence'] = det_array[:, 5]
+    class_ids = det_array[:, 6].astype(np.int16)
+    batch['class_id'] = class_ids
+    batch['cube_id'] = CLASS_TO_CUBE_ID[np.clip(class_ids, 0, len(CLASS_TO_CUBE_ID) - 1)]
+    return batch
+
+
+def select_ids(batch, ids=DRAWN_IDS):
+    """只保留指定编号的检测"""
+    if len(batch) == 0:
+        return batch
+    return batch[np.isin(batch['cube_id'], ids)]
+
+
+def obb_corners(batch):
+    """一次性计算所有旋转框的四个角点，返回 N×4×2 数组"""
+    radians = np.radians(batch['angle'].astype(np.float64))
+    cos_a = np.cos(radians)[:, None]
+    sin_a = np.sin(radians)[:, None]
+
+    half_w = (batch['width'] / 2)[:, None]
+    half_h = (batch['height'] / 2)[:, None]
+    local_x = np.array([-1, 1, 1, -1]) * half_w
+    local_y = np.array([-1, -1, 1, 1]) * half_h
+
+    corners = np.empty((len(batch), 4, 2), dtype=np.float64)
+    corners[:, :, 0] = local_x * cos_a - local_y * sin_a + batch['center_x'][:, None]
+    corners[:, :, 1] = local_x * sin_a + local_y * cos_a + batch['center_y'][:, None]
+    return corners
+
+
+def to_records(batch):
+    """转换为字典列表（用于JSON序列化，格式与旧版检测字典一致）"""
+    return [
+        {
+            "id": str(int(det['cube_id'])),
+            "center_x": float(det['center_x']),
+            "center_y": float(det['center_y']),
+            "width": float(det['width']),
+            "height": float(det['height']),
+            "angle": float(det['angle']),
+            "confidence": float(det['confidence']),
+            "class_id": int(det['class_id']),
+        }
+        for det in batch
+    ]
+
+
+def to_json(batch, **extra):
+    """序列化检测批次，可附带帧序号、时间戳等字段"""
+    return json.dumps({**extra, "detections": to_records(batch)})
@@ -0,0 +1,120 @@
+import asyncio
+import threading
+
+
+class EventFilter:
+    """按toio编号和事件类型过滤事件（None 表示不过滤）"""
+
+    def __init__(self, bus, cube_ids=None, kinds=None):
+        self.bus = bus
+        self.cube_ids = frozenset(cube_ids) if cube_ids is not None else None
+        self.kinds = frozenset(kinds) if kinds is not None else None
+
+    def matches(self, event):
+        if self.kinds is not None and event.kind not in self.kinds:
+            return False
+        if self.cube_ids is not None and event.cube_id not in self.cube_ids:
+            return False
+        return True
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class Subscription(EventFilter):
+    """asyncio订阅：await get() 或 async for 接收匹配的事件
+
+    事件对象本身不可变，所有订阅者共享同一个对象，不做复制。队列满时丢弃最旧的事件。
+    """
+
+    def __init__(self, bus, cube_ids=None, kinds=None, maxsize=64):
+        super().__init__(bus, cube_ids, kinds)
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def _deliver(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.queue.get()
+
+
+class CallbackSubscription(EventFilter):
+    """回调订阅：在事件循环线程中直接调用 callback(event)，供视频流服务器等非asyncio组件使用"""
+
+    def __init__(self, bus, callback, cube_ids=None, kinds=None):
+        super().__init__(bus, cube_ids, kinds)
+        self.callback = callback
+
+    def _deliver(self, event):
+        try:
+            self.callback(event)
+        except Exception as e:
+            print(f"⚠️  事件回调错误: {e}")
+
+
+class EventBus:
+    """检测线程 → asyncio 的事件总线
+
+    检测线程调用 publish()，事件通过 loop.call_soon_threadsafe 投递到事件循环，
+    由事件循环分发给所有匹配的订阅；订阅者 await 事件即可，不需要轮询。
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.subscriptions = []
+        self.lock = threading.Lock()
+        self.published = 0
+        self.unattached = 0  # 事件循环尚未就绪时被丢弃的事件数
+
+    def attach(self, loop=None):
+        """绑定事件循环（在事件循环中调用）"""
+        self.loop = loop or asyncio.get_running_loop()
+
+    def subscribe(self, cube_ids=None, kinds=None, maxsize=64):
+        """创建asyncio订阅（在事件循环中调用）"""
+        subscription = Subscription(self, cube_ids, kinds, maxsize)
+        with self.lock:
+            self.subscriptions.append(subscription)
+        return subscription
+
+    def subscribe_callback(self, callback, cube_ids=None, kinds=None):
+        """注册回调订阅，callback 在事件循环线程中被调用"""
+        subscription = CallbackSubscription(self, callback, cube_ids, kinds)
+        with self.lock:
+            self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            if subscription in self.subscriptions:
+                self.subscriptions.remove(subscription)
+
+    def publish(self, event):
+        """发布事件（任意线程可调用，不阻塞）"""
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            self.unattached += 1
+            return
+        self.published += 1
+        try:
+            loop.call_soon_threadsafe(self._dispatch, event)
+        except RuntimeError:
+            # 事件循环已关闭（程序退出中）
+            self.unattached += 1
+
+    def _dispatch(self, event):
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            if subscription.matches(event):
+                subscription._deliver(event)
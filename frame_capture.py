@@ -0,0 +1,129 @@
+import threading
+import time
+
+from frame_pool import FramePool
+
+
+class LatestFrameCapture:
+    """摄像头采集线程 - 独占VideoCapture，只保留最新一帧
+
+    检测循环处理速度慢于摄像头帧率时，旧帧会被直接覆盖（计入丢帧数），
+    保证每次推理拿到的都是最新画面，而不是摄像头缓冲区里积压的旧帧。
+    画面直接读入缓冲池中预分配的数组，被覆盖且无人持有的旧帧回到池中复用。
+    """
+
+    def __init__(self, cap, name="FrameCapture", pool=None):
+        self.cap = cap
+        self.name = name
+        self.pool = pool if pool is not None else FramePool()
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+        # 最新帧（PooledFrame，采集线程持有一个引用）及其元数据
+        self.frame = None
+        self.timestamp = 0.0
+        self.seq = 0
+
+        # 统计信息
+        self.consumed_seq = 0
+        self.dropped_frames = 0
+        self.read_failures = 0
+
+    def start(self):
+        """启动采集线程"""
+        if self.running:
+            return self
+        self.running = True
+        self.thread = threading.Thread(target=self._capture_loop, name=self.name, daemon=True)
+        self.thread.start()
+        return self
+
+    def _read(self):
+        """读入一帧到池中的缓冲区，返回 PooledFrame；失败时返回None"""
+        buffer = self.pool.acquire()
+        try:
+            if buffer is None:
+                ret, frame = self.cap.read()
+            else:
+                ret, frame = self.cap.read(buffer.array)
+        except Exception as e:
+            print(f"⚠️  摄像头读取异常: {e}")
+            ret, frame = False, None
+
+        if not ret or frame is None:
+            if buffer is not None:
+                buffer.release()
+            return None
+        if buffer is None or frame is not buffer.array:
+            # 首帧或画面尺寸变化：摄像头分配了新数组，纳入池中管理
+            if buffer is not None:
+                buffer.release()
+            buffer = self.pool.wrap(frame)
+        return buffer
+
+    def _capture_loop(self):
+        """采集循环：持续读取摄像头，用新帧覆盖旧帧"""
+        while self.running:
+            buffer = self._read()
+            capture_time = time.time()
+
+            if buffer is None:
+                self.read_failures += 1
+                time.sleep(0.005)
+                continue
+
+            with self.condition:
+                # 上一帧还没被取走就被覆盖，记为丢帧
+                if self.frame is not None and self.seq > self.consumed_seq:
+                    self.dropped_frames += 1
+                previous, self.frame = self.frame, buffer
+                self.timestamp = capture_time
+                self.seq += 1
+                self.condition.notify_all()
+            if previous is not None:
+                previous.release()
+
+    def read_latest(self, last_seq=0, timeout=1.0):
+        """等待比 last_seq 更新的帧
+
+        返回 (ret, frame, timestamp, seq)，超时或已停止时 ret 为 False。
+        frame 为 PooledFrame（图像数组为 frame.array），调用者持有一个引用，用完后必须 release()；
+        在引用释放前采集线程不会复用它的缓冲区。
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.seq > last_seq or not self.running, timeout)
+            if self.seq <= last_seq or self.frame is None:
+                return False, None, 0.0, last_seq
+
+            self.consumed_seq = self.seq
+            return True, self.frame.retain(), self.timestamp, self.seq
+
+    def get_stats(self):
+        """获取采集统计信息"""
+        with self.condition:
+            return {
+                'seq': self.seq,
+                'dropped_frames': self.dropped_frames,
+                'read_failures': self.read_failures,
+                'pool': self.pool.get_stats(),
+                'frame_age': time.time() - self.timestamp if self.timestamp else None,
+            }
+
+    def stop(self):
+        """停止采集线程并释放摄像头"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2.0)
+        self.thread = None
+
+        with self.condition:
+            previous, self.frame = self.frame, None
+        if previous is not None:
+            previous.release()
+
+        if self.cap is not None:
+            self.cap.release()
@@ -0,0 +1,99 @@
+import threading
+
+import numpy as np
+
+
+class PooledFrame:
+    """缓冲池中的一帧画面（带引用计数）
+
+    array 为实际的图像数组。需要跨帧持有画面的一方（预览窗口、视频流、流水线等）
+    先 retain()，用完后 release()；引用计数归零时缓冲区回到池中，供下一次采集直接复用。
+    持有引用期间不应再修改画面内容。
+    """
+
+    def __init__(self, pool, array):
+        self.pool = pool
+        self.array = array
+        self.refs = 1
+
+    @property
+    def shape(self):
+        return self.array.shape
+
+    def retain(self):
+        with self.pool.lock:
+            self.refs += 1
+        return self
+
+    def release(self):
+        with self.pool.lock:
+            self.refs -= 1
+            if self.refs == 0:
+                self.pool._recycle(self)
+
+
+def release_frame(frame):
+    """释放 PooledFrame 的引用；普通数组或None直接忽略"""
+    if isinstance(frame, PooledFrame):
+        frame.release()
+
+
+def frame_array(frame):
+    """PooledFrame 或普通数组 -> 图像数组"""
+    return frame.array if isinstance(frame, PooledFrame) else frame
+
+
+class FramePool:
+    """预分配的画面缓冲池
+
+    摄像头直接读入池中的数组（cap.read(buffer.array)），不再每帧分配新数组；
+    池为空时才分配新的缓冲区（计入 allocations），画面尺寸变化时旧尺寸的缓冲区被丢弃。
+    """
+
+    def __init__(self, max_free=6):
+        self.max_free = max_free
+        self.lock = threading.Lock()
+        self.shape = None
+        self.dtype = np.uint8
+        self.free = []
+
+        self.allocations = 0
+        self.reuses = 0
+
+    def acquire(self):
+        """取出一个缓冲区（引用计数为1）；尚未确定画面尺寸时返回None"""
+        with self.lock:
+            if self.shape is None:
+                return None
+            if self.free:
+                self.reuses += 1
+                array = self.free.pop()
+            else:
+                self.allocations += 1
+                array = np.empty(self.shape, dtype=self.dtype)
+        return PooledFrame(self, array)
+
+    def wrap(self, array):
+        """把池外分配的数组（首帧或尺寸变化后的画面）纳入池中管理"""
+        with self.lock:
+            if array.shape != self.shape or array.dtype != self.dtype:
+                self.shape = array.shape
+                self.dtype = array.dtype
+                self.free = []
+            self.allocations += 1
+        return PooledFrame(self, array)
+
+    def _recycle(self, frame):
+        # 调用方已持有 self.lock
+        array = frame.array
+        if array.shape == self.shape and array.dtype == self.dtype and len(self.free) < self.max_free:
+            self.free.append(array)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'shape': self.shape,
+                'allocations': self.allocations,
+                'reuses': self.reuses,
+                'free': len(self.free),
+            }
@@ -0,0 +1,238 @@
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+NO_ZONE = 0                  # 不在任何区域内
+GEOFENCE_HYSTERESIS = 6      # 离开区域时需要越过边界的距离（像素），抑制边界附近的检测抖动
+MAX_ZONES = 31               # 每个区域在滞回栅格中占一位（uint32）
+PRE_EXIT_SAMPLES = 8         # 预测路径上的采样点数
+PRE_EXIT_REARM_TIME = 1.0    # 触发预测离开事件后，至少经过该时间（秒）且不再预计离开时才允许再次触发
+
+GeofenceEvent = namedtuple(
+    'GeofenceEvent',
+    ['kind', 'cube_id', 'zone', 'previous_zone', 'timestamp', 'position', 'dwell', 'time_to_exit'],
+    defaults=(None,),
+)
+GeofenceEvent.__doc__ = """区域事件：kind 为 'enter' / 'exit' / 'dwell' / 'pre_exit'，zone 为区域名称（exit、pre_exit 时为将要离开的区域）
+
+pre_exit 的 time_to_exit 为按当前速度预计到达边界的时间（秒）。
+"""
+
+
+class LeadTimeEstimator:
+    """采集→BLE命令发出延迟的在线估计
+
+    与TCP重传超时的估计方法相同：平滑均值 + 4倍平均偏差，延迟抖动越大提前量越大。
+    """
+
+    def __init__(self, initial=0.3, alpha=0.125, beta=0.25, minimum=0.05, maximum=1.5):
+        self.mean = initial
+        self.deviation = initial / 4
+        self.alpha = alpha
+        self.beta = beta
+        self.minimum = minimum
+        self.maximum = maximum
+        self.samples = 0
+
+    def record(self, latency):
+        self.deviation += self.beta * (abs(latency - self.mean) - self.deviation)
+        self.mean += self.alpha * (latency - self.mean)
+        self.samples += 1
+
+    @property
+    def lead_time(self):
+        return min(max(self.mean + 4 * self.deviation, self.minimum), self.maximum)
+
+
+class Zone:
+    """电子围栏区域（圆、圆环、多边形），rasterize 在画面大小的掩码上画出区域"""
+
+    def __init__(self, name, kind, params, dwell_time=None):
+        self.name = name
+        self.kind = kind
+        self.params = params
+        self.dwell_time = dwell_time  # 连续停留超过该时间（秒）时触发一次 dwell 事件，None 表示不触发
+
+    def rasterize(self, shape):
+        mask = np.zeros(shape[:2], dtype=np.uint8)
+        if self.kind == 'circle':
+            center, radius = self.params
+            cv2.circle(mask, tuple(int(v) for v in center), int(radius), 1, -1)
+        elif self.kind == 'ring':
+            center, inner_radius, outer_radius = self.params
+            center = tuple(int(v) for v in center)
+            cv2.circle(mask, center, int(outer_radius), 1, -1)
+            cv2.circle(mask, center, int(inner_radius), 0, -1)
+        elif self.kind == 'polygon':
+            points = np.asarray(self.params, dtype=np.int32).reshape(-1, 1, 2)
+            cv2.fillPoly(mask, [points], 1)
+        else:
+            raise ValueError(f"未知的区域类型: {self.kind}")
+        return mask.astype(bool)
+
+
+def circle_zone(name, center, radius, dwell_time=None):
+    return Zone(name, 'circle', (center, radius), dwell_time)
+
+
+def ring_zone(name, center, inner_radius, outer_radius, dwell_time=None):
+    return Zone(name, 'ring', (center, inner_radius, outer_radius), dwell_time)
+
+
+def polygon_zone(name, points, dwell_time=None):
+    return Zone(name, 'polygon', points, dwell_time)
+
+
+class GeofenceEngine:
+    """栅格化的多区域电子围栏
+
+    按画面尺寸预先生成区域编号栅格（重叠时后面的区域覆盖前面的），每帧所有目标用一次数组索引查询所在区域，
+    与区域形状无关。另有一张按 hysteresis 外扩后的区域位图：目标只有越过当前区域边界 hysteresis 像素后
+    才算离开，边界附近的抖动不会反复触发进入/离开事件。滞回只对离开生效：进入后面（优先级更高）的区域时立即切换。
+    """
+
+    def __init__(self, zones, hysteresis=GEOFENCE_HYSTERESIS):
+        self.zones = list(zones)
+        if len(self.zones) > MAX_ZONES:
+            raise ValueError(f"区域数量不能超过 {MAX_ZONES}")
+        self.zone_ids = {zone.name: i + 1 for i, zone in enumerate(self.zones)}
+        self.hysteresis = hysteresis
+
+        self.shape = None
+        self.zone_raster = None   # 每个像素所在的区域编号（0 表示不在区域内）
+        self.sticky_raster = None  # 第 i 位为 1 表示该像素在区域 i 外扩 hysteresis 的范围内
+
+        self.states = {}  # cube_id -> [区域编号, 进入时间, 是否已触发停留事件, 上次预测离开的时间]
+
+    def zone_id(self, name):
+        return self.zone_ids[name]
+
+    def zone_name(self, zone_id):
+        return self.zones[zone_id - 1].name if zone_id != NO_ZONE else None
+
+    def build(self, shape):
+        """按画面尺寸生成栅格（尺寸不变时不重复生成）"""
+        shape = tuple(shape[:2])
+        if shape == self.shape:
+            return
+        self.zone_raster = np.zeros(shape, dtype=np.uint8)
+        self.sticky_raster = np.zeros(shape, dtype=np.uint32)
+        size = 2 * self.hysteresis + 1
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size))
+        for zone_id, zone in enumerate(self.zones, start=1):
+            mask = zone.rasterize(shape)
+            self.zone_raster[mask] = zone_id
+            if self.hysteresis > 0:
+                mask = cv2.dilate(mask.astype(np.uint8), kernel).astype(bool)
+            self.sticky_raster[mask] |= np.uint32(1 << zone_id)
+        self.shape = shape
+
+    def _pixels(self, xs, ys):
+        h, w = self.shape
+        xs = np.asarray(xs).astype(int)
+        ys = np.asarray(ys).astype(int)
+        inside = (xs >= 0) & (xs < w) & (ys >= 0) & (ys < h)
+        return np.clip(xs, 0, w - 1), np.clip(ys, 0, h - 1), inside
+
+    def lookup(self, xs, ys):
+        """查询一组坐标所在的区域编号（不带滞回，画面外为 NO_ZONE）"""
+        xs, ys, inside = self._pixels(xs, ys)
+        return np.where(inside, self.zone_raster[ys, xs], NO_ZONE)
+
+    def current_zones(self, cube_ids):
+        """各目标当前（经过滞回）所在的区域编号，未出现过的目标为 NO_ZONE"""
+        return np.array([self.states[c][0] if c in self.states else NO_ZONE for c in cube_ids], dtype=np.uint8)
+
+    def update(self, cube_ids, xs, ys, timestamp, frame_shape):
+        """用本帧各目标的位置更新区域状态
+
+        返回 (区域编号数组, 事件列表)；目标第一次出现时只记录状态，不触发事件。
+        """
+        self.build(frame_shape)
+        cube_ids = np.asarray(cube_ids).tolist()
+        if not cube_ids:
+            return np.zeros(0, dtype=np.uint8), []
+
+        px, py, inside = self._pixels(xs, ys)
+        raw = np.where(inside, self.zone_raster[py, px], NO_ZONE)
+        sticky = np.where(inside, self.sticky_raster[py, px], 0)
+
+        previous = self.current_zones(cube_ids).astype(np.uint32)
+        # 仍在当前区域外扩范围内、且没有进入优先级更高（编号更大）的区域时保持当前区域，
+        # 嵌套或重叠在当前区域上的高优先级区域仍能正常进入
+        stay = (
+            (previous != NO_ZONE)
+            & (((sticky >> previous) & 1) == 1)
+            & ((raw == NO_ZONE) | (raw < previous))
+        )
+        zones = np.where(stay, previous, raw).astype(np.uint8)
+
+        events = []
+        for cube_id, zone_id, x, y in zip(cube_ids, zones.tolist(), np.asarray(xs).tolist(), np.asarray(ys).tolist()):
+            state = self.states.get(cube_id)
+            if state is None:
+                self.states[cube_id] = [zone_id, timestamp, False, None]
+                continue
+
+            if zone_id != state[0]:
+                dwell = timestamp - state[1]
+                if state[0] != NO_ZONE:
+                    events.append(GeofenceEvent('exit', cube_id, self.zone_name(state[0]), None, timestamp, (x, y), dwell))
+                if zone_id != NO_ZONE:
+                    events.append(GeofenceEvent('enter', cube_id, self.zone_name(zone_id), self.zone_name(state[0]), timestamp, (x, y), 0.0))
+                self.states[cube_id] = [zone_id, timestamp, False, None]
+                continue
+
+            if zone_id != NO_ZONE and not state[2]:
+                dwell_time = self.zones[zone_id - 1].dwell_time
+                if dwell_time is not None and timestamp - state[1] >= dwell_time:
+                    events.append(GeofenceEvent('dwell', cube_id, self.zone_name(zone_id), None, timestamp, (x, y), timestamp - state[1]))
+                    state[2] = True
+
+        return zones, events
+
+    def predict_exits(self, cube_ids, xs, ys, velocities_x, velocities_y, lead_time, timestamp):
+        """按当前速度外推 lead_time 秒内的路径，预计会离开当前区域的目标触发一次 'pre_exit' 事件
+
+        路径上的采样点一次性查询外扩栅格，与区域形状无关；需先调用 update 更新当前区域。
+        """
+        cube_ids = np.asarray(cube_ids).tolist()
+        if not cube_ids or lead_time <= 0 or self.shape is None:
+            return []
+
+        samples = np.linspace(lead_time / PRE_EXIT_SAMPLES, lead_time, PRE_EXIT_SAMPLES)
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        px, py, inside = self._pixels(
+            xs[:, None] + np.asarray(velocities_x, dtype=float)[:, None] * samples,
+            ys[:, None] + np.asarray(velocities_y, dtype=float)[:, None] * samples,
+        )
+        path_sticky = np.where(inside, self.sticky_raster[py, px], 0)
+        current = self.current_zones(cube_ids).astype(np.uint32)[:, None]
+        # 与 update 的滞回一致：路径点超出当前区域外扩范围才算离开，静止在滞回带内不会触发
+        leaving = (current != NO_ZONE) & (((path_sticky >> current) & 1) == 0)
+        will_leave = leaving.any(axis=1)
+        first_outside = leaving.argmax(axis=1)
+
+        events = []
+        for i, cube_id in enumerate(cube_ids):
+            state = self.states.get(cube_id)
+            if state is None:
+                continue
+            if will_leave[i]:
+                if state[3] is None:
+                    events.append(GeofenceEvent(
+                        'pre_exit', cube_id, self.zone_name(state[0]), None, timestamp,
+                        (float(xs[i]), float(ys[i])), timestamp - state[1], float(samples[first_outside[i]]),
+                    ))
+                    state[3] = timestamp
+            elif state[3] is not None and timestamp - state[3] > PRE_EXIT_REARM_TIME:
+                state[3] = None
+        return events
+
+    def forget(self, cube_id):
+        self.states.pop(cube_id, None)
+
+    def reset(self):
+        self.states = {}
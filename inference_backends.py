@@ -0,0 +1,186 @@
+import hashlib
+import importlib.util
+import os
+import shutil
+
+# 可选的推理后端，及其运行时依赖的Python模块
+INFERENCE_BACKENDS = {
+    'torch': 'torch',
+    'onnx': 'onnxruntime',
+    'onnx_int8': 'onnxruntime',
+    'openvino': 'openvino',
+}
+
+# INT8量化的校准画面目录（录制的真实场景图片或视频）及使用的画面数
+INT8_CALIBRATION_SOURCE = 'Yolo/calibration_frames'
+INT8_CALIBRATION_FRAMES = 200
+
+# 融合/导出后的模型缓存目录（位于.pt文件所在目录下），文件名带源模型的哈希
+MODEL_CACHE_DIR_NAME = '.model_cache'
+
+# 导出为动态输入尺寸：固定尺寸的导出模型每次推理都会被ultralytics改回导出时的imgsz，
+# 按帧选择的推理尺寸（ROI、自适应调度、丢失目标重新检测）都会失效
+DYNAMIC_EXPORT = True
+
+_file_hashes = {}
+
+
+def is_backend_available(backend):
+    """检查推理后端的运行时是否已安装"""
+    module_name = INFERENCE_BACKENDS.get(backend)
+    if module_name is None:
+        return False
+    return importlib.util.find_spec(module_name) is not None
+
+
+def resolve_backend(backend):
+    """校验配置的后端，不可用时回退到torch"""
+    if backend not in INFERENCE_BACKENDS:
+        print(f"⚠️  未知的推理后端 '{backend}'，改用 torch")
+        return 'torch'
+    if backend != 'torch' and not is_backend_available(backend):
+        print(f"⚠️  推理后端 '{backend}' 未安装（需要 {INFERENCE_BACKENDS[backend]}），改用 torch")
+        return 'torch'
+    return backend
+
+
+def model_file_hash(model_path):
+    """模型文件内容的SHA-256（前16位），按路径、大小和修改时间缓存结果"""
+    stat = os.stat(model_path)
+    key = (os.path.abspath(model_path), stat.st_size, stat.st_mtime)
+    if key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(model_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        _file_hashes[key] = digest.hexdigest()[:16]
+    return _file_hashes[key]
+
+
+def exported_model_path(model_path, backend, imgsz):
+    """缓存中融合/导出模型的路径，源模型内容变化后哈希随之变化，自动重新生成"""
+    cache_dir = os.path.join(os.path.dirname(model_path) or '.', MODEL_CACHE_DIR_NAME)
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    prefix = os.path.join(cache_dir, f"{stem}-{model_file_hash(model_path)}")
+
+    size = 'dynamic' if DYNAMIC_EXPORT else imgsz
+    if backend == 'onnx':
+        return f"{prefix}-{size}.onnx"
+    if backend == 'onnx_int8':
+        return f"{prefix}-{size}-int8.onnx"
+    if backend == 'openvino':
+        return f"{prefix}-{size}_openvino_model"
+    return f"{prefix}-fused.pt"
+
+
+def _save_fused_model(model_path, export_path):
+    """加载.pt模型，融合Conv+BN后保存为精简的检查点（不含优化器等训练状态）"""
+    import torch
+    from ultralytics import YOLO
+
+    print("🔧 正在融合模型并写入缓存，只需执行一次...")
+    model = YOLO(model_path)
+    model.fuse()
+
+    checkpoint = dict(model.ckpt or {})
+    checkpoint.update({'model': model.model, 'ema': None, 'optimizer': None})
+
+    temp_path = export_path + '.tmp'
+    torch.save(checkpoint, temp_path)
+    os.replace(temp_path, export_path)
+    print(f"✅ 融合模型已缓存: {export_path}")
+    return export_path
+
+
+def export_model(model_path, backend, imgsz, calibration_source=None, **export_args):
+    """把.pt模型融合/导出为指定后端格式，缓存中已有时直接复用
+
+    ONNX/OpenVINO 按 DYNAMIC_EXPORT 导出为动态输入尺寸，imgsz 只用于导出时的示例输入和INT8校准；
+    动态导出失败时抛出异常，由 load_inference_model 回退到 torch，不会得到忽略 imgsz 的固定尺寸模型。
+    """
+    export_path = exported_model_path(model_path, backend, imgsz)
+    if os.path.exists(export_path):
+        return export_path
+
+    os.makedirs(os.path.dirname(export_path), exist_ok=True)
+
+    if backend == 'torch':
+        return _save_fused_model(model_path, export_path)
+
+    if backend == 'onnx_int8':
+        # 先导出FP32的ONNX，再用录制画面做静态量化
+        from model_quantization import load_frames, quantize_onnx_model
+
+        fp32_path = export_model(model_path, 'onnx', imgsz, **export_args)
+        source = calibration_source or INT8_CALIBRATION_SOURCE
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"INT8校准画面不存在: {source}")
+        frames = load_frames(source, max_frames=INT8_CALIBRATION_FRAMES)
+        return quantize_onnx_model(fp32_path, export_path, frames, imgsz)
+
+    from ultralytics import YOLO
+
+    export_args.setdefault('dynamic', DYNAMIC_EXPORT)
+    size_text = '动态输入尺寸' if export_args['dynamic'] else f"固定输入尺寸 {imgsz}"
+    print(f"🔧 正在导出 {backend} 模型（{size_text}），只需执行一次...")
+    output = YOLO(model_path).export(format=backend, imgsz=imgsz, **export_args)
+
+    # ultralytics固定导出到 <stem>.onnx / <stem>_openvino_model，移动到缓存路径
+    if os.path.abspath(str(output)) != os.path.abspath(export_path):
+        if os.path.isdir(export_path):
+            shutil.rmtree(export_path)
+        elif os.path.exists(export_path):
+            os.remove(export_path)
+        shutil.move(str(output), export_path)
+
+    print(f"✅ 模型已导出: {export_path}")
+    return export_path
+
+
+def select_device(device='auto'):
+    """'auto' 时有CUDA用GPU，否则用CPU（只在需要时才导入torch）"""
+    if device != 'auto':
+        return device
+    try:
+        import torch
+        return 'cuda' if torch.cuda.is_available() else 'cpu'
+    except Exception:
+        return 'cpu'
+
+
+def load_inference_model(model_path, backend='torch', imgsz=640, overrides=None, use_cache=True):
+    """按后端加载OBB模型，返回 (model, 实际使用的后端)
+
+    返回的仍是ultralytics的YOLO对象，predict输出的 r.obb 格式与torch后端一致，
+    因此 detect_objects 的解析逻辑无需区分后端。
+    torch后端默认加载缓存中已融合的模型，省去每次启动时的融合开销。
+    """
+    from ultralytics import YOLO
+
+    backend = resolve_backend(backend)
+    model = None
+    if backend != 'torch':
+        try:
+            export_path = export_model(model_path, backend, imgsz)
+            model = YOLO(export_path, task='obb')
+        except Exception as e:
+            print(f"⚠️  {backend} 后端加载失败: {e}，改用 torch")
+            backend = 'torch'
+
+    if model is None and use_cache:
+        try:
+            model = YOLO(export_model(model_path, 'torch', imgsz))
+        except Exception as e:
+            print(f"⚠️  融合模型缓存不可用: {e}，直接加载原始模型")
+
+    if model is None:
+        model = YOLO(model_path)
+
+    overrides = dict(overrides or {})
+    if backend != 'torch':
+        # 导出的模型只在CPU上运行
+        overrides['device'] = 'cpu'
+    overrides['device'] = select_device(overrides.get('device', 'auto'))
+    model.overrides.update(overrides)
+
+    return model, backend
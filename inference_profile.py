@@ -0,0 +1,34 @@
+import json
+import os
+
+from inference_backends import model_file_hash
+
+PROFILE_PATH = 'inference_profile.json'
+
+
+def load_profile(path=PROFILE_PATH, model_path=None):
+    """读取 tune_inference.py 生成的性能配置文件，不存在或无法解析时返回None
+
+    指定 model_path 时校验模型文件哈希，配置是为其他模型生成的则忽略推理部分。
+    """
+    if not path or not os.path.exists(path):
+        return None
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            profile = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️  性能配置文件读取失败（{path}）: {e}")
+        return None
+
+    expected_hash = profile.get('model_hash')
+    if model_path and expected_hash and os.path.exists(model_path) and model_file_hash(model_path) != expected_hash:
+        print(f"⚠️  性能配置文件是为其他模型生成的，忽略推理配置（请重新运行 tune_inference.py）")
+        profile.pop('inference', None)
+    return profile
+
+
+def save_profile(profile, path=PROFILE_PATH):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, ensure_ascii=False, indent=2)
+    print(f"💾 性能配置已保存: {path}")
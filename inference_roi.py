@@ -0,0 +1,91 @@
+import math
+
+import numpy as np
+
+ROI_SIZE_STEP = 64     # ROI宽高按该步长向上取整，尺寸小幅变化时不必重建共享内存缓冲区
+IMGSZ_STRIDE = 32      # YOLO输入尺寸必须是stride的整数倍
+
+
+def clip_roi(roi, frame_shape):
+    """把 (x0, y0, x1, y1) 限制在画面范围内"""
+    h, w = frame_shape[:2]
+    x0, y0, x1, y1 = roi
+    return max(0, int(x0)), max(0, int(y0)), min(w, int(math.ceil(x1))), min(h, int(math.ceil(y1)))
+
+
+def align_roi(roi, frame_shape, step=ROI_SIZE_STEP):
+    """以ROI中心为基准把宽高扩展到step的整数倍，超出画面时整体平移回画面内"""
+    h, w = frame_shape[:2]
+    x0, y0, x1, y1 = roi
+    roi_w = min(w, int(math.ceil((x1 - x0) / step)) * step)
+    roi_h = min(h, int(math.ceil((y1 - y0) / step)) * step)
+
+    left = int(round((x0 + x1 - roi_w) / 2))
+    top = int(round((y0 + y1 - roi_h) / 2))
+    left = min(max(0, left), w - roi_w)
+    top = min(max(0, top), h - roi_h)
+    return left, top, left + roi_w, top + roi_h
+
+
+def circle_roi(center_x, center_y, radius, margin, frame_shape):
+    """圆圈外接正方形外扩margin后的区域"""
+    extent = radius + margin
+    return clip_roi((center_x - extent, center_y - extent, center_x + extent, center_y + extent), frame_shape)
+
+
+def tracked_roi(tracks, margin, frame_shape):
+    """包含所有跟踪目标（旋转框外接范围）外扩margin后的区域，没有目标时返回None"""
+    if len(tracks) == 0:
+        return None
+    half = np.maximum(tracks['width'], tracks['height']) / 2 + margin
+    return clip_roi((
+        float(np.min(tracks['center_x'] - half)),
+        float(np.min(tracks['center_y'] - half)),
+        float(np.max(tracks['center_x'] + half)),
+        float(np.max(tracks['center_y'] + half)),
+    ), frame_shape)
+
+
+def union_roi(a, b):
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+
+
+def roi_input_size(roi, max_size, stride=IMGSZ_STRIDE):
+    """按ROI长边选择推理尺寸：小区域按原始分辨率推理，不超过max_size"""
+    longest = max(roi[2] - roi[0], roi[3] - roi[1])
+    return int(min(max_size, math.ceil(longest / stride) * stride))
+
+
+def offset_detections(det_array, x0, y0):
+    """把ROI内的 N×7 检测结果平移回整帧坐标"""
+    if len(det_array) == 0 or (x0 == 0 and y0 == 0):
+        return det_array
+    det_array = det_array.copy()
+    det_array[:, 0] += x0
+    det_array[:, 1] += y0
+    return det_array
+
+
+def select_roi(mode, frame_shape, circle, margin, tracks=None, expected_ids=()):
+    """按配置选择本帧的推理区域
+
+    mode:
+        'full'    - 整帧
+        'circle'  - 圆圈外扩margin
+        'tracked' - 圆圈与所有跟踪目标范围的并集；没有目标或有需要监控的目标未被跟踪到时退回整帧，以便重新发现
+        (x0, y0, x1, y1) - 固定区域
+    """
+    h, w = frame_shape[:2]
+    full = (0, 0, w, h)
+
+    if mode == 'full':
+        return full
+    if isinstance(mode, (tuple, list)):
+        return align_roi(clip_roi(mode, frame_shape), frame_shape)
+
+    roi = circle_roi(*circle, margin, frame_shape)
+    if mode == 'tracked':
+        if tracks is None or len(tracks) == 0 or not np.all(np.isin(expected_ids, tracks['cube_id'])):
+            return full
+        roi = union_roi(roi, tracked_roi(tracks, margin, frame_shape))
+    return align_roi(roi, frame_shape)
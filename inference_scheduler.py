@@ -0,0 +1,117 @@
+import time
+
+# ========== 调度配置 ==========
+IMGSZ_LADDER = (640, 512, 416, 320)   # 可选推理尺寸（从高到低）
+MAX_INFERENCE_INTERVAL = 4            # 最多每隔几帧推理一次（中间帧由跟踪器预测）
+LATENCY_EMA_ALPHA = 0.2               # 延迟指数滑动平均系数
+DEGRADE_RATIO = 1.1                   # 平均延迟超过目标的该倍数时降级
+UPGRADE_RATIO = 0.7                   # 平均延迟低于目标的该倍数时升级
+ADJUST_COOLDOWN = 1.0                 # 两次调整之间至少间隔（秒），等新设置的延迟稳定下来
+IDLE_TIME = 3.0                       # 所有目标静止且无人观看超过该时间（秒）后进入低功耗
+LOW_POWER_FPS = 5.0                   # 低功耗模式下的处理帧率
+
+
+def build_levels(imgsz_ladder=IMGSZ_LADDER, max_interval=MAX_INFERENCE_INTERVAL):
+    """生成由高到低的质量档位 (imgsz, 推理间隔, 是否运行可选检测)
+
+    降级顺序：先关闭可选检测，再逐级降低推理尺寸，最后拉长推理间隔。
+    """
+    levels = [(imgsz_ladder[0], 1, True)]
+    levels += [(imgsz, 1, False) for imgsz in imgsz_ladder]
+    levels += [(imgsz_ladder[-1], interval, False) for interval in range(2, max_interval + 1)]
+    return levels
+
+
+class AdaptiveScheduler:
+    """自适应推理调度器
+
+    持续测量“采集 → 检测结果可用”的端到端延迟，在质量档位之间升降，
+    使平均延迟保持在目标以内；所有目标静止且没有视频流客户端时降到低功耗帧率。
+    """
+
+    def __init__(self, latency_target, imgsz_ladder=IMGSZ_LADDER, max_interval=MAX_INFERENCE_INTERVAL,
+                 low_power_fps=LOW_POWER_FPS, idle_time=IDLE_TIME):
+        self.latency_target = latency_target
+        self.levels = build_levels(imgsz_ladder, max_interval)
+        self.level = 0
+        self.low_power_fps = low_power_fps
+        self.idle_time = idle_time
+
+        self.latency_ema = None
+        self.last_adjust_time = time.time()
+        self.frame_index = 0
+        self.last_active_time = time.time()
+        self.low_power = False
+
+    @property
+    def imgsz(self):
+        return self.levels[self.level][0]
+
+    @property
+    def interval(self):
+        return self.levels[self.level][1]
+
+    @property
+    def optional_passes(self):
+        """是否允许运行可选的附加检测（例如丢失目标的重新检测）"""
+        return self.levels[self.level][2] and not self.low_power
+
+    def should_infer(self):
+        """本帧是否运行检测，按当前推理间隔轮转"""
+        infer = self.frame_index % self.interval == 0
+        self.frame_index += 1
+        return infer
+
+    def record_latency(self, latency):
+        """记录一次端到端检测延迟（秒），必要时调整档位"""
+        if self.latency_ema is None:
+            self.latency_ema = latency
+        else:
+            self.latency_ema += LATENCY_EMA_ALPHA * (latency - self.latency_ema)
+
+        now = time.time()
+        if now - self.last_adjust_time < ADJUST_COOLDOWN or self.low_power:
+            return
+
+        if self.latency_ema > self.latency_target * DEGRADE_RATIO and self.level < len(self.levels) - 1:
+            self._set_level(self.level + 1, now)
+        elif self.latency_ema < self.latency_target * UPGRADE_RATIO and self.level > 0:
+            self._set_level(self.level - 1, now)
+
+    def _set_level(self, level, now):
+        self.level = level
+        self.last_adjust_time = now
+        self.frame_index = 0
+        imgsz, interval, passes = self.levels[level]
+        print(f"⚙️  推理调度: 平均延迟 {self.latency_ema * 1000:.0f}ms → 推理尺寸 {imgsz}，"
+              f"每 {interval} 帧推理一次，可选检测{'开启' if passes else '关闭'}")
+
+    def update_activity(self, active, stream_clients=0):
+        """更新活动状态：有目标在移动/丢失，或有人在看视频流时保持正常帧率"""
+        now = time.time()
+        if active or stream_clients > 0:
+            self.last_active_time = now
+            if self.low_power:
+                self.low_power = False
+                print("⚡ 检测到活动，退出低功耗模式")
+            return
+
+        if not self.low_power and now - self.last_active_time > self.idle_time:
+            self.low_power = True
+            print(f"💤 所有目标静止且无人观看，进入低功耗模式（{self.low_power_fps:.0f} FPS）")
+
+    def frame_delay(self, frame_start_time):
+        """低功耗模式下本帧处理完后需要等待的时间（秒）"""
+        if not self.low_power:
+            return 0.0
+        return max(0.0, 1.0 / self.low_power_fps - (time.time() - frame_start_time))
+
+    def get_stats(self):
+        return {
+            'level': self.level,
+            'imgsz': self.imgsz,
+            'interval': self.interval,
+            'optional_passes': self.optional_passes,
+            'latency_ema': self.latency_ema,
+            'low_power': self.low_power,
+        }
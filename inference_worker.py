@@ -0,0 +1,507 @@
+import multiprocessing as mp
+import os
+import time
+import warnings
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+import numpy as np
+
+# 检测结果每行的列：cx, cy, w, h, angle, conf, class_id
+DETECTION_COLUMNS = 7
+EMPTY_DETECTIONS = np.zeros((0, DETECTION_COLUMNS), dtype=np.float32)
+
+
+def results_to_array(results):
+    """把ultralytics的OBB结果一次性转换为 N×7 的float32数组"""
+    arrays = []
+    for r in results:
+        if r.obb is not None and len(r.obb.data) > 0:
+            arrays.append(r.obb.data.cpu().numpy())
+
+    if not arrays:
+        return EMPTY_DETECTIONS
+    return np.ascontiguousarray(np.concatenate(arrays, axis=0)[:, :DETECTION_COLUMNS], dtype=np.float32)
+
+
+class SharedFrameRing:
+    """基于共享内存的帧环形缓冲区
+
+    主进程把帧写入某个槽位，推理进程直接在同一块共享内存上构造ndarray视图读取，
+    跨进程传递的只有槽位编号，不需要序列化整帧图像。
+    每个槽位的容量按创建时的帧尺寸分配，更小的画面（ROI、切片、重新检测窗口）可直接放入。
+    """
+
+    def __init__(self, shm, shape, slots, dtype, owner):
+        self.shm = shm
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.dtype = np.dtype(dtype)
+        self.owner = owner
+        self.slot_size = int(np.prod(self.shape))
+        self.frames = np.ndarray((slots,) + self.shape, dtype=self.dtype, buffer=shm.buf)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @classmethod
+    def create(cls, shape, slots, dtype=np.uint8):
+        """在主进程中创建环形缓冲区"""
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize * slots
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        return cls(shm, shape, slots, dtype, owner=True)
+
+    @classmethod
+    def attach(cls, name, shape, slots, dtype):
+        """在推理进程中连接已存在的环形缓冲区"""
+        shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, shape, slots, dtype, owner=False)
+
+    def slot(self, index, shape=None):
+        """返回槽位的ndarray视图（不复制），shape 指定时按该尺寸解释槽位开头的数据"""
+        if shape is None or tuple(shape) == self.shape:
+            return self.frames[index]
+        return self.frames[index].reshape(-1)[:int(np.prod(shape))].reshape(shape)
+
+    def fits(self, frame):
+        return frame.dtype == self.dtype and frame.size <= self.slot_size
+
+    def close(self):
+        """释放映射，创建方同时删除共享内存"""
+        self.frames = None
+        try:
+            self.shm.close()
+            if self.owner:
+                self.shm.unlink()
+        except Exception:
+            pass
+
+
+def pin_inference_threads(torch_threads, cpu_cores):
+    """限制当前进程使用的CPU核心和torch线程数（多进程并行时避免线程超额竞争）"""
+    if cpu_cores and hasattr(os, 'sched_setaffinity'):
+        try:
+            os.sched_setaffinity(0, cpu_cores)
+        except OSError:
+            pass
+
+    if torch_threads:
+        # 必须在导入torch之前设置，OpenMP线程池只在初始化时读取
+        os.environ['OMP_NUM_THREADS'] = str(torch_threads)
+        os.environ['MKL_NUM_THREADS'] = str(torch_threads)
+        try:
+            import torch
+            torch.set_num_threads(torch_threads)
+            torch.set_num_interop_threads(1)
+        except (ImportError, RuntimeError):
+            pass
+
+
+def _inference_worker_main(conn, model_path, backend, overrides, predict_args, torch_threads=None, cpu_cores=None):
+    """推理进程入口：加载模型，循环处理主进程发来的槽位请求"""
+    warnings.filterwarnings('ignore')
+    pin_inference_threads(torch_threads, cpu_cores)
+
+    try:
+        from inference_backends import load_inference_model
+        model, backend = load_inference_model(model_path, backend, predict_args.get('imgsz', 640), overrides)
+    except Exception as e:
+        conn.send(('error', str(e)))
+        conn.close()
+        return
+
+    conn.send(('ready', f"{backend}/{model.overrides.get('device')}"))
+
+    ring = None
+    try:
+        while True:
+            message = conn.recv()
+            kind = message[0]
+
+            if kind == 'stop':
+                break
+
+            if kind == 'attach':
+                if ring is not None:
+                    ring.close()
+                _, name, shape, slots, dtype = message
+                ring = SharedFrameRing.attach(name, shape, slots, dtype)
+
+            elif kind == 'infer':
+                _, seq, slot, frame_time, imgsz, shape = message
+                args = predict_args if imgsz is None else dict(predict_args, imgsz=imgsz)
+                start_time = time.perf_counter()
+                try:
+                    results = model.predict(source=ring.slot(slot, shape), **args)
+                    detections = results_to_array(results)
+                except Exception as e:
+                    print(f"❌ 推理进程检测错误: {e}")
+                    detections = EMPTY_DETECTIONS
+                infer_time = time.perf_counter() - start_time
+                conn.send(('result', seq, slot, frame_time, detections, infer_time))
+
+            elif kind == 'infer_batch':
+                # 多个槽位作为一个批次推理（例如高分辨率画面的切片）
+                _, seq, slots, frame_time, imgsz, shape = message
+                args = predict_args if imgsz is None else dict(predict_args, imgsz=imgsz)
+                start_time = time.perf_counter()
+                try:
+                    results = model.predict(source=[ring.slot(slot, shape) for slot in slots], **args)
+                    detections = [results_to_array([r]) for r in results]
+                except Exception as e:
+                    print(f"❌ 推理进程批量检测错误: {e}")
+                    detections = [EMPTY_DETECTIONS] * len(slots)
+                infer_time = time.perf_counter() - start_time
+                conn.send(('batch_result', seq, slots, frame_time, detections, infer_time))
+
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        if ring is not None:
+            ring.close()
+        conn.close()
+
+
+class InferenceProcess:
+    """独立进程中的YOLO推理器
+
+    PyTorch前后处理持有GIL时不会再阻塞BLE控制协程和Flask推流线程；
+    主进程在等待结果时阻塞于管道读取，期间释放GIL。
+    """
+
+    def __init__(self, model_path, overrides, predict_args, slots=3, backend='torch',
+                 torch_threads=None, cpu_cores=None, name="YOLOInference"):
+        self.model_path = model_path
+        self.backend = backend
+        self.overrides = dict(overrides)
+        self.predict_args = dict(predict_args)
+        self.slots = slots
+        self.torch_threads = torch_threads
+        self.cpu_cores = cpu_cores
+        self.name = name
+
+        self.process = None
+        self.conn = None
+        self.ring = None
+        self.free_slots = []
+        self.in_flight = 0
+        self.next_seq = 0
+        self.last_infer_time = 0.0
+
+    def start(self, timeout=120.0):
+        """启动推理进程并等待模型加载完成"""
+        ctx = mp.get_context('spawn')
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_inference_worker_main,
+            args=(child_conn, self.model_path, self.backend, self.overrides, self.predict_args,
+                  self.torch_threads, self.cpu_cores),
+            name=self.name,
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+        if not self.conn.poll(timeout):
+            print("❌ 推理进程启动超时")
+            self.stop()
+            return False
+
+        message = self.conn.recv()
+        if message[0] != 'ready':
+            print(f"❌ 推理进程模型加载失败: {message[1]}")
+            self.stop()
+            return False
+
+        print(f"✅ 推理进程已启动（PID: {self.process.pid}，后端/设备: {message[1]}）")
+        return True
+
+    def _ensure_ring(self, frame, slots=0):
+        """按帧尺寸和所需槽位数创建（或重建）共享内存环形缓冲区
+
+        已有缓冲区容纳得下时直接复用，只有出现更大的画面或需要更多槽位时才重建。
+        """
+        slots = max(self.slots, slots)
+        if self.ring is not None and self.ring.fits(frame) and self.ring.slots >= slots:
+            return True
+        if self.in_flight > 0:
+            return False
+
+        shape = frame.shape
+        if self.ring is not None:
+            if self.ring.slot_size > frame.size:
+                shape = self.ring.shape
+            self.ring.close()
+        self.ring = SharedFrameRing.create(shape, slots, frame.dtype)
+        self.free_slots = list(range(slots))
+        self.conn.send(('attach', self.ring.name, self.ring.shape, slots, self.ring.dtype.str))
+        return True
+
+    def submit(self, frame, seq=None, frame_time=None, imgsz=None):
+        """把帧写入空闲槽位并提交推理，没有空闲槽位时返回False（丢弃该帧）
+
+        imgsz 为None时使用启动时的推理尺寸，否则按本帧指定的尺寸推理（例如ROI裁剪后的小图）。
+        """
+        if not self._ensure_ring(frame) or not self.free_slots:
+            return False
+
+        if seq is None:
+            seq = self.next_seq
+        self.next_seq = seq + 1
+
+        slot = self.free_slots.pop(0)
+        np.copyto(self.ring.slot(slot, frame.shape), frame)
+        self.conn.send(('infer', seq, slot, frame_time, imgsz, frame.shape))
+        self.in_flight += 1
+        return True
+
+    def get_result(self, timeout=None):
+        """取回一个推理结果 (seq, frame_time, detections, infer_time)，超时返回None
+
+        批量推理的结果中 detections 为与输入一一对应的检测数组列表。
+        """
+        if self.in_flight == 0 or not self.conn.poll(timeout):
+            return None
+
+        kind, seq, slot, frame_time, detections, infer_time = self.conn.recv()
+        if kind == 'batch_result':
+            self.free_slots.extend(slot)
+        else:
+            self.free_slots.append(slot)
+        self.in_flight -= 1
+        self.last_infer_time = infer_time
+        return seq, frame_time, detections, infer_time
+
+    def infer(self, frame, timeout=5.0, imgsz=None):
+        """同步推理一帧，返回 N×7 检测数组；失败返回None"""
+        # 丢弃之前超时遗留的结果，保证返回的是本帧的检测
+        while self.in_flight > 0:
+            if self.get_result(timeout) is None:
+                return None
+
+        if not self.submit(frame, imgsz=imgsz):
+            return None
+
+        result = self.get_result(timeout)
+        if result is None:
+            return None
+        return result[2]
+
+    def submit_batch(self, frames, seq=None, imgsz=None):
+        """把一批尺寸相同的画面作为一个请求提交，槽位不足时返回False"""
+        if not self._ensure_ring(frames[0], len(frames)) or len(self.free_slots) < len(frames):
+            return False
+
+        if seq is None:
+            seq = self.next_seq
+        self.next_seq = seq + 1
+
+        slots = self.free_slots[:len(frames)]
+        del self.free_slots[:len(frames)]
+        shape = frames[0].shape
+        for slot, frame in zip(slots, frames):
+            np.copyto(self.ring.slot(slot, shape), frame)
+
+        self.conn.send(('infer_batch', seq, slots, None, imgsz, shape))
+        self.in_flight += 1
+        return True
+
+    def infer_batch(self, frames, timeout=10.0, imgsz=None):
+        """同步推理一批尺寸相同的画面，返回与输入一一对应的检测数组列表；失败返回None"""
+        while self.in_flight > 0:
+            if self.get_result(timeout) is None:
+                return None
+
+        if not self.submit_batch(frames, imgsz=imgsz):
+            return None
+
+        result = self.get_result(timeout)
+        if result is None:
+            return None
+        return result[2]
+
+    def stop(self):
+        """停止推理进程并释放共享内存"""
+        if self.conn is not None:
+            try:
+                self.conn.send(('stop',))
+            except Exception:
+                pass
+
+        if self.process is not None:
+            self.process.join(timeout=3.0)
+            if self.process.is_alive():
+                self.process.terminate()
+            self.process = None
+
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+        self.free_slots = []
+        self.in_flight = 0
+
+
+class InferenceWorkerPool:
+    """多个推理进程组成的进程池，按帧序号流水线推理
+
+    每个进程加载一份模型并绑定到一组CPU核心（torch线程数与核心数一致）；
+    指定 cpu_cores（例如调优得到的核心集合）时在各进程之间平分这些核心，否则平分本机全部核心。
+    帧按轮转方式分发到有空闲槽位的进程；结果经重排序后按帧序号顺序输出，
+    超过 max_latency 仍未返回的帧直接放弃，其迟到的结果会被丢弃，保证延迟有上界。
+    接口与 InferenceProcess 兼容（infer / infer_batch / submit / stop）。
+    """
+
+    def __init__(self, model_path, overrides, predict_args, workers=2, slots=2, backend='torch',
+                 threads_per_worker=None, pin_cores=True, max_latency=0.5, cpu_cores=None):
+        available = sorted(cpu_cores) if cpu_cores else list(range(os.cpu_count() or 1))
+        share = max(1, len(available) // workers)
+        threads = min(threads_per_worker, share) if threads_per_worker else share
+        self.max_latency = max_latency
+        self.workers = []
+        for i in range(workers):
+            cores = None
+            if pin_cores:
+                # 核心数少于进程数时多个进程共用核心
+                cores = set(available[i * share:(i + 1) * share]) or {available[i % len(available)]}
+            self.workers.append(InferenceProcess(
+                model_path, overrides, predict_args, slots=slots, backend=backend,
+                torch_threads=threads, cpu_cores=cores, name=f"YOLOInference-{i}",
+            ))
+
+        self.next_worker = 0
+        self.next_seq = 0
+        self.pending = {}   # seq -> 提交时间
+        self.ready = {}     # seq -> 推理结果，等待按顺序输出
+        self.expired = set()  # 超时已放弃（已计入 dropped_late）、结果尚未返回的帧
+        self.completed = 0
+        self.dropped_late = 0
+        self.dropped_busy = 0
+        self.last_infer_time = 0.0
+
+    def start(self, timeout=120.0):
+        """启动所有推理进程，至少一个成功时返回True"""
+        self.workers = [worker for worker in self.workers if worker.start(timeout)]
+        if not self.workers:
+            return False
+        print(f"✅ 推理进程池已启动（{len(self.workers)} 个进程）")
+        return True
+
+    @property
+    def in_flight(self):
+        return sum(worker.in_flight for worker in self.workers)
+
+    def submit(self, frame, seq=None, frame_time=None, imgsz=None):
+        """把帧轮转分发给下一个有空闲槽位的进程，全部繁忙时丢弃该帧并返回False"""
+        if seq is None:
+            seq = self.next_seq
+        self.next_seq = seq + 1
+
+        for offset in range(len(self.workers)):
+            index = (self.next_worker + offset) % len(self.workers)
+            if self.workers[index].submit(frame, seq, frame_time, imgsz):
+                self.next_worker = (index + 1) % len(self.workers)
+                self.pending[seq] = time.time()
+                return True
+
+        self.dropped_busy += 1
+        return False
+
+    def _collect(self, timeout):
+        """接收已完成的结果放入重排序缓冲区"""
+        busy = {worker.conn: worker for worker in self.workers if worker.in_flight > 0}
+        if not busy:
+            self.expired.clear()  # 没有仍在推理的帧，超时帧的结果不会再返回
+            return
+
+        for conn in wait(list(busy), timeout):
+            result = busy[conn].get_result(0)
+            if result is None:
+                continue
+            seq = result[0]
+            self.last_infer_time = result[3]
+            if self.pending.pop(seq, None) is None:
+                # 已放弃等待的帧（放弃时已计数）或同步推理遗留的结果，直接丢弃
+                self.expired.discard(seq)
+                continue
+            self.ready[seq] = result
+
+    def get_results(self, timeout=0.0):
+        """按帧序号顺序返回已完成的结果列表 [(seq, frame_time, detections, infer_time)]"""
+        self._collect(timeout)
+
+        now = time.time()
+        for seq in [s for s, submit_time in self.pending.items() if now - submit_time > self.max_latency]:
+            del self.pending[seq]
+            self.expired.add(seq)
+            self.dropped_late += 1
+
+        results = []
+        while self.ready:
+            seq = min(self.ready)
+            if self.pending and min(self.pending) < seq:
+                break  # 更早的帧还在推理中，等它完成后再按顺序输出
+            results.append(self.ready.pop(seq))
+            self.completed += 1
+        return results
+
+    def outstanding(self, seq):
+        """该帧是否仍在推理或等待按顺序输出（False 表示已输出或已被丢弃）"""
+        return seq in self.pending or seq in self.ready
+
+    def warm_up(self, frame, runs=1, timeout=30.0, imgsz=None):
+        """每个进程都推理 runs 次（轮转调用 infer 只会预热到部分进程），全部成功时返回True"""
+        ok = True
+        for _ in range(runs):
+            submitted = [worker for worker in self.workers if worker.submit(frame, imgsz=imgsz)]
+            ok = ok and len(submitted) == len(self.workers)
+            for worker in submitted:
+                if worker.get_result(timeout) is None:
+                    ok = False
+        return ok
+
+    def infer(self, frame, timeout=5.0, imgsz=None):
+        """同步推理一帧（轮转选择进程），返回 N×7 检测数组；失败返回None"""
+        worker = self.workers[self.next_worker]
+        self.next_worker = (self.next_worker + 1) % len(self.workers)
+        return worker.infer(frame, timeout, imgsz)
+
+    def infer_batch(self, frames, timeout=10.0, imgsz=None):
+        """把一批画面（例如切片）拆分到各个进程并行推理，返回与输入一一对应的检测数组列表"""
+        for worker in self.workers:
+            while worker.in_flight > 0:
+                if worker.get_result(timeout) is None:
+                    return None
+
+        chunks = np.array_split(np.arange(len(frames)), min(len(self.workers), len(frames)))
+        for worker, chunk in zip(self.workers, chunks):
+            if not worker.submit_batch([frames[i] for i in chunk], imgsz=imgsz):
+                return None
+
+        detections = []
+        for worker, chunk in zip(self.workers, chunks):
+            result = worker.get_result(timeout)
+            if result is None:
+                return None
+            detections.extend(result[2])
+        return detections
+
+    def get_stats(self):
+        return {
+            'workers': len(self.workers),
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'dropped_late': self.dropped_late,
+            'dropped_busy': self.dropped_busy,
+        }
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+        self.pending.clear()
+        self.ready.clear()
+        self.expired.clear()
@@ -0,0 +1,110 @@
+import glob
+import os
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def load_frames(source, max_frames=None, step=1):
+    """读取录制的画面：图片目录（按文件名排序）或视频文件"""
+    frames = []
+
+    if os.path.isdir(source):
+        paths = sorted(
+            p for p in glob.glob(os.path.join(source, '*'))
+            if p.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        for path in paths[::step]:
+            frame = cv2.imread(path)
+            if frame is not None:
+                frames.append(frame)
+            if max_frames and len(frames) >= max_frames:
+                break
+        return frames
+
+    cap = cv2.VideoCapture(source)
+    index = 0
+    while cap.isOpened():
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if index % step == 0:
+            frames.append(frame)
+            if max_frames and len(frames) >= max_frames:
+                break
+        index += 1
+    cap.release()
+    return frames
+
+
+def letterbox_tensor(frame, imgsz):
+    """按ultralytics的letterbox方式预处理，返回 1×3×imgsz×imgsz 的float32张量"""
+    h, w = frame.shape[:2]
+    scale = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top = (imgsz - new_h) // 2
+    left = (imgsz - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+
+    tensor = canvas[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+    return np.ascontiguousarray(tensor[np.newaxis])
+
+
+class FrameCalibrationReader:
+    """ONNX Runtime静态量化的校准数据读取器（使用真实录制画面）"""
+
+    def __init__(self, input_name, frames, imgsz):
+        self.input_name = input_name
+        self.frames = frames
+        self.imgsz = imgsz
+        self.index = 0
+
+    def get_next(self):
+        if self.index >= len(self.frames):
+            return None
+        frame = self.frames[self.index]
+        self.index += 1
+        return {self.input_name: letterbox_tensor(frame, self.imgsz)}
+
+    def rewind(self):
+        self.index = 0
+
+
+def quantize_onnx_model(fp32_path, int8_path, calibration_frames, imgsz):
+    """把FP32的ONNX模型静态量化为INT8（QDQ格式，权重按通道量化）"""
+    import onnx
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+
+    if not calibration_frames:
+        raise ValueError("INT8量化需要校准画面")
+
+    fp32_model = onnx.load(fp32_path)
+    input_name = fp32_model.graph.input[0].name
+    reader = FrameCalibrationReader(input_name, calibration_frames, imgsz)
+
+    print(f"🔧 正在量化模型（校准画面 {len(calibration_frames)} 张）...")
+    quantize_static(
+        fp32_path,
+        int8_path,
+        reader,
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+
+    # 保留ultralytics写入的元数据（类别名、stride、imgsz等），否则加载后类别名会丢失
+    int8_model = onnx.load(int8_path)
+    existing = {prop.key for prop in int8_model.metadata_props}
+    for prop in fp32_model.metadata_props:
+        if prop.key not in existing:
+            int8_model.metadata_props.add(key=prop.key, value=prop.value)
+    onnx.save(int8_model, int8_path)
+
+    print(f"✅ INT8模型已生成: {int8_path}")
+    return int8_path
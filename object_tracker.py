@@ -0,0 +1,227 @@
+import math
+
+import numpy as np
+
+from detection_batch import EMPTY_TRACKS, TRACK_DTYPE
+
+# ========== 跟踪配置 ==========
+MAX_COAST_TIME = 0.5          # 未检测到时按速度外推的最长时间（秒），超过后视为丢失
+FORGET_TIME = 10.0            # 丢失超过该时间后删除轨迹（期间仍可按编号重新找回）
+ASSOCIATION_GATE = 60.0       # 预测位置与检测中心的最大匹配距离（像素）
+CLASS_MISMATCH_COST = 25.0    # 类别不一致时附加的匹配代价（像素），用于吸收类别抖动
+CLASS_SWITCH_FRAMES = 3       # 连续多少帧被识别为其他编号后才改变轨迹编号
+ACCELERATION_NOISE = 300.0    # 过程噪声：加速度标准差（像素/秒²）
+MEASUREMENT_NOISE = 3.0       # 观测噪声：检测中心的标准差（像素）
+MIN_HEADING_SPEED = 5.0       # 速度低于该值（像素/秒）时沿用上一次的运动方向
+
+
+class KalmanTrack:
+    """单个目标的匀速卡尔曼滤波轨迹，状态为 (x, y, vx, vy)"""
+
+    def __init__(self, detection, timestamp):
+        self.cube_id = int(detection['cube_id'])
+        self.state = np.array([detection['center_x'], detection['center_y'], 0.0, 0.0], dtype=np.float64)
+        self.covariance = np.diag([MEASUREMENT_NOISE ** 2, MEASUREMENT_NOISE ** 2, 100.0 ** 2, 100.0 ** 2])
+        self.detection = detection.copy()  # 最近一次匹配到的检测（尺寸、角度、置信度）
+        self.last_update_time = timestamp
+        self.last_predict_time = timestamp
+        self.heading = 0.0
+        self.hits = 1
+        self.switch_id = None
+        self.switch_count = 0
+
+    def predict(self, timestamp):
+        """按匀速模型把状态推进到指定时间"""
+        dt = timestamp - self.last_predict_time
+        if dt <= 0:
+            return
+        self.last_predict_time = timestamp
+
+        F = np.eye(4)
+        F[0, 2] = F[1, 3] = dt
+        q = ACCELERATION_NOISE ** 2
+        dt2, dt3, dt4 = dt * dt, dt ** 3 / 2, dt ** 4 / 4
+        Q = q * np.array([
+            [dt4, 0, dt3, 0],
+            [0, dt4, 0, dt3],
+            [dt3, 0, dt2, 0],
+            [0, dt3, 0, dt2],
+        ])
+        self.state = F @ self.state
+        self.covariance = F @ self.covariance @ F.T + Q
+
+    def update(self, detection, timestamp):
+        """用检测中心修正状态"""
+        measurement = np.array([detection['center_x'], detection['center_y']], dtype=np.float64)
+        S = self.covariance[:2, :2] + np.eye(2) * MEASUREMENT_NOISE ** 2
+        K = self.covariance[:, :2] @ np.linalg.inv(S)
+        self.state = self.state + K @ (measurement - self.state[:2])
+        self.covariance = self.covariance - K @ self.covariance[:2, :]
+
+        self.detection = detection.copy()
+        self.last_update_time = timestamp
+        self.hits += 1
+        self._vote_class(int(detection['cube_id']))
+
+    def _vote_class(self, detected_id):
+        """类别投票：偶发的错误类别不改变编号，连续多帧一致才切换"""
+        if detected_id == self.cube_id:
+            self.switch_id = None
+            self.switch_count = 0
+            return
+        if detected_id == self.switch_id:
+            self.switch_count += 1
+        else:
+            self.switch_id = detected_id
+            self.switch_count = 1
+
+    def reset(self, detection, timestamp):
+        """丢失后在别处重新出现：直接以新检测重新初始化位置"""
+        self.__init__(detection, timestamp)
+
+    @property
+    def position(self):
+        return self.state[0], self.state[1]
+
+    @property
+    def velocity(self):
+        return self.state[2], self.state[3]
+
+    def time_since_update(self, timestamp):
+        return timestamp - self.last_update_time
+
+    def expected_position(self, timestamp, max_coast_time=MAX_COAST_TIME):
+        """目标此刻最可能的位置：外推时间内用匀速预测，丢失较久后用最后一次检测到的位置"""
+        dt = timestamp - self.last_update_time
+        if dt > max_coast_time:
+            return float(self.detection['center_x']), float(self.detection['center_y'])
+        dt = timestamp - self.last_predict_time
+        return self.state[0] + self.state[2] * dt, self.state[1] + self.state[3] * dt
+
+
+class MultiObjectTracker:
+    """多目标跟踪器
+
+    每个toio编号对应一条轨迹。检测与预测位置按“距离 + 类别不一致惩罚”贪心匹配，
+    偶发漏检时输出外推的预测位姿（coasting），避免控制器在短暂丢失时停下。
+    """
+
+    def __init__(self, max_coast_time=MAX_COAST_TIME, forget_time=FORGET_TIME, gate=ASSOCIATION_GATE):
+        self.max_coast_time = max_coast_time
+        self.forget_time = forget_time
+        self.gate = gate
+        self.tracks = {}  # cube_id -> KalmanTrack
+        self.last_output = EMPTY_TRACKS  # 最近一次 update 的输出
+
+    def _associate(self, tracks, detections):
+        """贪心匹配，返回 [(track, det_index)] 以及未匹配的检测下标"""
+        if not tracks or len(detections) == 0:
+            return [], list(range(len(detections)))
+
+        predicted = np.array([track.position for track in tracks])
+        centers = np.stack([detections['center_x'], detections['center_y']], axis=1).astype(np.float64)
+        cost = np.linalg.norm(predicted[:, None, :] - centers[None, :, :], axis=2)
+        track_ids = np.array([track.cube_id for track in tracks])
+        cost += np.where(track_ids[:, None] != detections['cube_id'][None, :], CLASS_MISMATCH_COST, 0.0)
+
+        matches = []
+        used_tracks, used_dets = set(), set()
+        for flat_index in np.argsort(cost, axis=None):
+            t, d = np.unravel_index(flat_index, cost.shape)
+            if cost[t, d] > self.gate:
+                break
+            if t in used_tracks or d in used_dets:
+                continue
+            used_tracks.add(t)
+            used_dets.add(d)
+            matches.append((tracks[t], int(d)))
+
+        unmatched = [d for d in range(len(detections)) if d not in used_dets]
+        return matches, unmatched
+
+    def update(self, detections, timestamp):
+        """输入一帧检测批次，返回跟踪批次（见 detection_batch.TRACK_DTYPE）"""
+        for track in self.tracks.values():
+            track.predict(timestamp)
+
+        # 只与未超时的轨迹做运动匹配，已丢失的轨迹只能按编号重新找回
+        active = [t for t in self.tracks.values() if t.time_since_update(timestamp) <= self.max_coast_time]
+        matches, unmatched = self._associate(active, detections)
+        matched_ids = set()
+        for track, det_index in matches:
+            track.update(detections[det_index], timestamp)
+            matched_ids.add(track.cube_id)
+
+        for det_index in unmatched:
+            detection = detections[det_index]
+            cube_id = int(detection['cube_id'])
+            if cube_id in matched_ids:
+                continue  # 同一编号本帧已匹配，视为重复检测
+            if cube_id in self.tracks:
+                self.tracks[cube_id].reset(detection, timestamp)
+            else:
+                self.tracks[cube_id] = KalmanTrack(detection, timestamp)
+            matched_ids.add(cube_id)
+
+        self._apply_class_switches(matched_ids)
+
+        for cube_id in [i for i, t in self.tracks.items() if t.time_since_update(timestamp) > self.forget_time]:
+            del self.tracks[cube_id]
+
+        self.last_output = self._build_output(timestamp)
+        return self.last_output
+
+    def _apply_class_switches(self, matched_ids):
+        """连续多帧识别为另一编号、且该编号没有活动轨迹时才改变轨迹编号"""
+        for track in list(self.tracks.values()):
+            new_id = track.switch_id
+            if self.tracks.get(track.cube_id) is not track:
+                continue
+            if new_id is None or track.switch_count < CLASS_SWITCH_FRAMES or new_id in matched_ids:
+                continue
+            del self.tracks[track.cube_id]
+            self.tracks.pop(new_id, None)
+            matched_ids.discard(track.cube_id)
+            matched_ids.add(new_id)
+            track.cube_id = new_id
+            track.switch_id = None
+            track.switch_count = 0
+            self.tracks[new_id] = track
+
+    def _build_output(self, timestamp):
+        tracks = [t for t in self.tracks.values() if t.time_since_update(timestamp) <= self.max_coast_time]
+        if not tracks:
+            return EMPTY_TRACKS
+
+        output = np.zeros(len(tracks), dtype=TRACK_DTYPE)
+        for i, track in enumerate(tracks):
+            record = output[i]
+            for name in track.detection.dtype.names:
+                record[name] = track.detection[name]
+
+            x, y = track.position
+            vx, vy = track.velocity
+            speed = math.hypot(vx, vy)
+            if speed >= MIN_HEADING_SPEED:
+                track.heading = math.degrees(math.atan2(vy, vx))
+
+            record['center_x'] = x
+            record['center_y'] = y
+            record['cube_id'] = track.cube_id
+            record['velocity_x'] = vx
+            record['velocity_y'] = vy
+            record['speed'] = speed
+            record['heading'] = track.heading
+            record['coasting'] = track.last_update_time < timestamp
+        return output
+
+    def get_track(self, cube_id):
+        return self.tracks.get(cube_id)
+
+    def lost_tracks(self, timestamp):
+        """已超出外推时间但尚未删除的轨迹（可用于重新检测）"""
+        return [t for t in self.tracks.values() if t.time_since_update(timestamp) > self.max_coast_time]
+
+    def reset(self):
+        self.tracks.clear()
+        self.last_output = EMPTY_TRACKS
@@ -0,0 +1,100 @@
+import cv2
+import numpy as np
+
+from detection_batch import obb_corners
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+LABEL_FONT = cv2.FONT_HERSHEY_DUPLEX
+
+INSIDE_BOX_COLOR = (255, 0, 0)
+OUTSIDE_BOX_COLOR = (0, 0, 255)
+PREDICTED_BOX_COLOR = (128, 128, 128)  # 预测位姿（本帧未检测到）
+INSIDE_CENTER_COLOR = (0, 255, 0)
+OUTSIDE_CENTER_COLOR = (0, 0, 255)
+LABEL_COLOR = (0, 255, 255)
+
+# 半径为2的实心圆点对应的像素偏移，用于一次性绘制所有中心点
+_DOT_OFFSETS = np.array([(dy, dx) for dy in range(-2, 3) for dx in range(-2, 3) if dy * dy + dx * dx <= 5])
+
+
+def circle_command(center, radius, color, thickness):
+    return lambda image: cv2.circle(image, center, radius, color, thickness)
+
+
+def text_command(text, org, scale, color, thickness=1, font=FONT):
+    return lambda image: cv2.putText(image, text, org, font, scale, color, thickness, cv2.LINE_AA)
+
+
+class OverlayRenderer:
+    """检测画面叠加层渲染器
+
+    - 静态内容（圆圈、圆心、说明文字、推流地址）的绘制命令只生成一次，每帧按顺序直接绘制；
+    - 所有旋转框的角点一次性计算，同色的框用一次 polylines 绘制，中心点用一次数组赋值绘制。
+    圆圈和文字都是细线条，cv2 直接绘制（约0.03毫秒）比按像素合成预渲染图层更快，因此不做alpha混合。
+    只负责绘制，不修改任何控制器状态。
+    """
+
+    def __init__(self, circle, circle_color=(0, 0, 0), circle_thickness=1):
+        self.circle = circle
+        self.circle_color = circle_color
+        self.circle_thickness = circle_thickness
+        self.static_lines = []
+        self.static_commands = None
+
+    def set_static_text(self, lines):
+        """设置静态说明文字 [(text, (x, y), scale, color)]，下次绘制时重新生成静态绘制命令"""
+        self.static_lines = list(lines)
+        self.static_commands = None
+
+    def _build_static_commands(self):
+        center_x, center_y, radius = self.circle
+        commands = [
+            circle_command((center_x, center_y), radius, self.circle_color, self.circle_thickness),
+            circle_command((center_x, center_y), 3, self.circle_color, -1),
+        ]
+        commands += [text_command(text, org, scale, color) for text, org, scale, color in self.static_lines]
+        return commands
+
+    def draw_static(self, frame):
+        if self.static_commands is None:
+            self.static_commands = self._build_static_commands()
+        for draw in self.static_commands:
+            draw(frame)
+
+    def draw_hud(self, frame, lines):
+        """绘制HUD文字 [(text, (x, y), scale, color)]（FPS等计数每帧都变化，直接绘制）"""
+        for text, org, scale, color in lines:
+            cv2.putText(frame, text, org, FONT, scale, color, 1, cv2.LINE_AA)
+
+    def draw_tracks(self, frame, tracks, in_circle, extra_labels=None):
+        """绘制旋转框、中心点和ID标签
+
+        extra_labels: {cube_id: [(text, dy, color), ...]}，显示在中心点右侧、相对中心下移dy像素（例如控制器状态）
+        """
+        if len(tracks) == 0:
+            return
+
+        corners = obb_corners(tracks).astype(np.int32)
+        coasting = tracks['coasting'] if 'coasting' in tracks.dtype.names else np.zeros(len(tracks), dtype=bool)
+        measured_inside = in_circle & ~coasting
+        measured_outside = ~in_circle & ~coasting
+        for mask, color in ((measured_inside, INSIDE_BOX_COLOR), (measured_outside, OUTSIDE_BOX_COLOR),
+                            (coasting, PREDICTED_BOX_COLOR)):
+            if mask.any():
+                cv2.polylines(frame, list(corners[mask]), True, color, 1)
+
+        centers_x = tracks['center_x'].astype(int)
+        centers_y = tracks['center_y'].astype(int)
+        h, w = frame.shape[:2]
+        ys = np.clip(centers_y[:, None] + _DOT_OFFSETS[:, 0], 0, h - 1)
+        xs = np.clip(centers_x[:, None] + _DOT_OFFSETS[:, 1], 0, w - 1)
+        colors = np.where(in_circle[:, None], INSIDE_CENTER_COLOR, OUTSIDE_CENTER_COLOR).astype(np.uint8)
+        frame[ys, xs] = colors[:, None, :]
+
+        for object_id, center_x, center_y in zip(tracks['cube_id'].tolist(), centers_x.tolist(), centers_y.tolist()):
+            cv2.putText(frame, f"ID:{object_id}", (center_x + 10, center_y - 10),
+                        LABEL_FONT, 0.35, LABEL_COLOR, 1, cv2.LINE_AA)
+            if extra_labels and object_id in extra_labels:
+                for text, dy, color in extra_labels[object_id]:
+                    cv2.putText(frame, text, (center_x + 10, center_y + dy),
+                                FONT, 0.3, color, 1, cv2.LINE_AA)
@@ -0,0 +1,91 @@
+import threading
+import time
+
+import cv2
+
+from frame_pool import PooledFrame, frame_array, release_frame
+
+
+class PreviewWindow:
+    """本地预览窗口 - 在独立线程中以限定的刷新率显示最新画面
+
+    检测线程只交出画面引用，窗口绘制、waitKey 都在预览线程中进行，
+    窗口被拖动或系统界面卡顿时不会拖慢推理。
+    """
+
+    def __init__(self, name, size=(1000, 750), max_fps=15.0, on_quit=None):
+        self.name = name
+        self.size = size
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.on_quit = on_quit  # 在窗口中按 q 时调用
+
+        self.frame = None
+        self.seq = 0
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.shown_frames = 0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, name=f"Preview-{self.name}", daemon=True)
+        self.thread.start()
+        return self
+
+    def show(self, frame):
+        """提交一帧待显示的画面（只保存引用，调用方之后不应再修改该画面）
+
+        frame 为 PooledFrame 时持有其引用，直到被下一帧替换。
+        """
+        if isinstance(frame, PooledFrame):
+            frame.retain()
+        with self.condition:
+            previous = self.frame
+            self.frame = frame
+            self.seq += 1
+            self.condition.notify()
+        release_frame(previous)
+
+    def _loop(self):
+        cv2.namedWindow(self.name, cv2.WINDOW_NORMAL)
+        cv2.resizeWindow(self.name, *self.size)
+
+        shown_seq = 0
+        last_show_time = 0.0
+        try:
+            while self.running:
+                with self.condition:
+                    # 超时返回也要调用 waitKey，保持窗口响应
+                    self.condition.wait_for(lambda: self.seq != shown_seq or not self.running, timeout=0.1)
+                    frame, seq = self.frame, self.seq
+                    if isinstance(frame, PooledFrame):
+                        frame.retain()
+
+                if frame is not None and seq != shown_seq:
+                    cv2.imshow(self.name, frame_array(frame))
+                    shown_seq = seq
+                    self.shown_frames += 1
+                    last_show_time = time.time()
+                release_frame(frame)
+
+                key = cv2.waitKey(1) & 0xFF
+                if key == ord('q') and self.on_quit is not None:
+                    self.on_quit()
+
+                # 限制刷新率：距离上一次显示不足 min_interval 时先等待
+                delay = self.min_interval - (time.time() - last_show_time)
+                if delay > 0:
+                    time.sleep(delay)
+        finally:
+            cv2.destroyWindow(self.name)
+
+    def stop(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+        with self.condition:
+            previous, self.frame = self.frame, None
+        release_frame(previous)
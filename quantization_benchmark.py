@@ -0,0 +1,190 @@
+"""FP32 / INT8 模型对比测试
+
+用录制的画面分别回放FP32和INT8模型，统计每帧延迟分位数，
+并比较 detect_objects 输出的中心点、角度、ID，以及 is_target_in_circle 判定是否翻转。
+只有ID和圆圈判定都没有翻转时才建议切换到INT8模型。
+
+用法:
+    python quantization_benchmark.py recordings/session1
+    python quantization_benchmark.py recordings/session1.mp4 --candidate onnx_int8 --calib Yolo/calibration_frames
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import combined_yolo_toio_control as app
+from inference_backends import INT8_CALIBRATION_SOURCE, export_model, load_inference_model
+from model_quantization import load_frames
+
+MATCH_RADIUS = 20.0   # 两个模型的检测中心距离小于该值（像素）时视为同一目标
+WARMUP_FRAMES = 5     # 预热帧数，不计入延迟统计
+
+
+def run_backend(backend, frames, model_path, imgsz):
+    """用指定后端跑完所有画面，返回 (每帧延迟ms数组, 每帧检测结果列表)"""
+    # 与 initialize_model 保持一致的推理参数
+    overrides = {
+        'verbose': False,
+        'device': 'cpu',
+        'half': False,
+        'agnostic_nms': True,
+        'max_det': 50,
+    }
+    model, actual_backend = load_inference_model(model_path, backend, imgsz, overrides)
+    if actual_backend != backend:
+        raise RuntimeError(f"后端 {backend} 不可用（实际加载: {actual_backend}）")
+
+    app.model = model
+    app.inference_process = None
+    app.INPUT_SIZE = imgsz
+
+    for frame in frames[:WARMUP_FRAMES]:
+        app.detect_objects(frame)
+
+    latencies = []
+    outputs = []
+    for frame in frames:
+        start_time = time.perf_counter()
+        detections = app.detect_objects(frame)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        outputs.append(detections)
+
+    return np.array(latencies), outputs
+
+
+def match_detections(reference, candidate):
+    """按中心距离贪心匹配两组检测，返回 [(ref_det, cand_det)] 以及未匹配的两组"""
+    pairs = []
+    for i, ref in enumerate(reference):
+        for j, cand in enumerate(candidate):
+            distance = np.hypot(ref['center_x'] - cand['center_x'], ref['center_y'] - cand['center_y'])
+            if distance <= MATCH_RADIUS:
+                pairs.append((distance, i, j))
+    pairs.sort()
+
+    used_ref, used_cand, matched = set(), set(), []
+    for _, i, j in pairs:
+        if i in used_ref or j in used_cand:
+            continue
+        used_ref.add(i)
+        used_cand.add(j)
+        matched.append((reference[i], candidate[j]))
+
+    missed = [d for i, d in enumerate(reference) if i not in used_ref]
+    extra = [d for j, d in enumerate(candidate) if j not in used_cand]
+    return matched, missed, extra
+
+
+def angle_difference(a, b):
+    """OBB角度差（弧度，按π周期折算，旋转矩形转180°后相同）"""
+    diff = (a - b + np.pi / 2) % np.pi - np.pi / 2
+    return abs(diff)
+
+
+def compare_outputs(reference_outputs, candidate_outputs, frames):
+    """逐帧比较两组检测结果（frames 用于按画面尺寸生成电子围栏栅格）"""
+    stats = {
+        'center_errors': [],
+        'angle_errors': [],
+        'id_flips': [],
+        'circle_flips': [],
+        'missed': 0,
+        'extra': 0,
+    }
+
+    exit_zone = app.geofence.zone_id(app.EXIT_ZONE)
+    for frame_index, (reference, candidate, frame) in enumerate(zip(reference_outputs, candidate_outputs, frames)):
+        app.geofence.build(frame.shape)
+        matched, missed, extra = match_detections(reference, candidate)
+        stats['missed'] += len(missed)
+        stats['extra'] += len(extra)
+
+        for ref, cand in matched:
+            stats['center_errors'].append(
+                np.hypot(ref['center_x'] - cand['center_x'], ref['center_y'] - cand['center_y'])
+            )
+            stats['angle_errors'].append(np.degrees(angle_difference(ref['angle'], cand['angle'])))
+
+            if ref['cube_id'] != cand['cube_id']:
+                stats['id_flips'].append((frame_index, int(ref['cube_id']), int(cand['cube_id'])))
+
+            # 与 update_detection_state 一致，按电子围栏栅格判断是否在 EXIT_ZONE 内（单帧比较，不带滞回）
+            ref_in = bool(app.geofence.lookup(ref['center_x'], ref['center_y']) == exit_zone)
+            cand_in = bool(app.geofence.lookup(cand['center_x'], cand['center_y']) == exit_zone)
+            if ref_in != cand_in:
+                stats['circle_flips'].append((frame_index, int(ref['cube_id']), ref_in, cand_in))
+
+    return stats
+
+
+def print_latency(name, latencies):
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+    print(f"   {name:<10} 平均 {latencies.mean():7.1f} ms | p50 {p50:7.1f} | p90 {p90:7.1f} | p99 {p99:7.1f} | 最大 {latencies.max():7.1f}")
+
+
+def print_error(name, values, unit):
+    if not values:
+        print(f"   {name}: 无匹配目标")
+        return
+    values = np.array(values)
+    print(f"   {name}: 平均 {values.mean():.2f}{unit} | p95 {np.percentile(values, 95):.2f}{unit} | 最大 {values.max():.2f}{unit}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FP32 / INT8 模型精度与延迟对比")
+    parser.add_argument('frames', help="录制画面：图片目录或视频文件")
+    parser.add_argument('--model', default=app.MODEL_PATH, help="原始 .pt 模型路径")
+    parser.add_argument('--imgsz', type=int, default=app.INPUT_SIZE)
+    parser.add_argument('--reference', default='torch', help="参考后端（FP32）")
+    parser.add_argument('--candidate', default='onnx_int8', help="待评估后端（INT8）")
+    parser.add_argument('--calib', default=INT8_CALIBRATION_SOURCE, help="INT8校准画面（图片目录或视频）")
+    parser.add_argument('--max-frames', type=int, default=500)
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames, max_frames=args.max_frames)
+    if not frames:
+        print(f"❌ 没有读取到画面: {args.frames}")
+        return 2
+    print(f"📂 已读取 {len(frames)} 帧画面")
+
+    if args.calib == args.frames:
+        print("⚠️  校准画面与测试画面相同，精度结果可能偏乐观")
+
+    if args.candidate == 'onnx_int8':
+        export_model(args.model, 'onnx_int8', args.imgsz, calibration_source=args.calib)
+
+    print(f"🔧 回放参考模型（{args.reference}）...")
+    reference_latency, reference_outputs = run_backend(args.reference, frames, args.model, args.imgsz)
+    print(f"🔧 回放待评估模型（{args.candidate}）...")
+    candidate_latency, candidate_outputs = run_backend(args.candidate, frames, args.model, args.imgsz)
+
+    stats = compare_outputs(reference_outputs, candidate_outputs, frames)
+
+    print("\n📊 每帧延迟（detect_objects，含后处理）:")
+    print_latency(args.reference, reference_latency)
+    print_latency(args.candidate, candidate_latency)
+    print(f"   加速比: {np.median(reference_latency) / np.median(candidate_latency):.2f}x（按p50）")
+
+    print("\n📐 检测结果差异:")
+    print_error("中心点偏差", stats['center_errors'], "px")
+    print_error("角度偏差", stats['angle_errors'], "°")
+    print(f"   漏检: {stats['missed']} | 多检: {stats['extra']}")
+    print(f"   ID翻转: {len(stats['id_flips'])} | 圆圈判定翻转: {len(stats['circle_flips'])}")
+
+    for frame_index, ref_id, cand_id in stats['id_flips'][:10]:
+        print(f"      帧 {frame_index}: ID {ref_id} → {cand_id}")
+    for frame_index, object_id, ref_in, cand_in in stats['circle_flips'][:10]:
+        print(f"      帧 {frame_index}: ID {object_id} 圆圈内 {ref_in} → {cand_in}")
+
+    if stats['id_flips'] or stats['circle_flips']:
+        print("\n❌ INT8模型改变了ID或圆圈判定，不建议使用")
+        return 1
+
+    print("\n✅ INT8模型未改变ID和圆圈判定")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+import cv2
+import numpy as np
+
+from detection_batch import EMPTY_BATCH
+
+# ========== 稀疏推理配置 ==========
+MIN_KEYFRAME_INTERVAL = 1     # 关键帧间隔下限（1 = 每帧都推理）
+MAX_KEYFRAME_INTERVAL = 8     # 关键帧间隔上限
+DRIFT_HIGH = 6.0              # 关键帧上光流预测与检测的最大偏差超过该值（像素）时缩短间隔
+DRIFT_LOW = 2.0               # 偏差低于该值时逐步延长间隔
+MIN_FLOW_POINTS = 4           # 每个目标至少需要跟踪成功的特征点数，不足时该目标本帧保持原位置
+MAX_POINTS_PER_OBJECT = 20
+FLOW_WINDOW = (15, 15)
+FLOW_PYRAMID_LEVELS = 2
+
+
+class SparseDetector:
+    """稀疏推理：只在关键帧上运行YOLO，中间帧用光流平移各目标的旋转框
+
+    每个目标在检测框内取少量角点，用金字塔LK光流跟踪到下一帧，取位移中位数作为框的平移量。
+    关键帧上把光流预测结果与新检测比较，按偏差自动调整关键帧间隔（只比较经过光流平移的目标）。
+    """
+
+    def __init__(self, detect_fn, interval=3, min_interval=MIN_KEYFRAME_INTERVAL, max_interval=MAX_KEYFRAME_INTERVAL):
+        self.detect_fn = detect_fn
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = max(min_interval, min(max_interval, interval))
+
+        self.prev_gray = None
+        self.batch = EMPTY_BATCH
+        self.points = []  # 每个目标的特征点 (K×1×2 float32)，与 batch 一一对应
+        self.frames_since_keyframe = 0
+        self.force_keyframe = True
+
+        self.keyframes = 0
+        self.propagated_frames = 0
+        self.held_tracks = 0  # 因特征点不足而保持原位置的目标次数
+        self.last_drift = 0.0
+
+    def _select_points(self, gray, batch):
+        """在每个检测框内选取用于光流跟踪的角点"""
+        points = []
+        h, w = gray.shape[:2]
+        for det in batch:
+            half = max(det['width'], det['height']) / 2
+            x0 = int(max(0, det['center_x'] - half))
+            y0 = int(max(0, det['center_y'] - half))
+            x1 = int(min(w, det['center_x'] + half))
+            y1 = int(min(h, det['center_y'] + half))
+            if x1 - x0 < 4 or y1 - y0 < 4:
+                points.append(None)
+                continue
+
+            corners = cv2.goodFeaturesToTrack(
+                gray[y0:y1, x0:x1], MAX_POINTS_PER_OBJECT, qualityLevel=0.01, minDistance=3
+            )
+            if corners is None:
+                points.append(None)
+                continue
+            corners = corners.astype(np.float32)
+            corners[:, 0, 0] += x0
+            corners[:, 0, 1] += y0
+            points.append(corners)
+        return points
+
+    def _propagate(self, gray):
+        """用光流把上一帧的检测框平移到当前帧
+
+        返回 (批次, 各目标是否经过光流平移)；整帧光流计算失败时返回 (None, None)。
+        特征点不足的目标只跳过该目标的光流，保持上一帧的位置，并在当前帧重新选取特征点。
+        """
+        flowed = np.zeros(len(self.batch), dtype=bool)
+        if self.prev_gray is None or len(self.batch) == 0:
+            return self.batch, flowed
+
+        batch = self.batch.copy()
+        new_points = [None] * len(self.points)
+        tracked = [i for i, points in enumerate(self.points) if points is not None]
+        if tracked:
+            all_points = np.concatenate([self.points[i] for i in tracked], axis=0)
+            next_points, status, _ = cv2.calcOpticalFlowPyrLK(
+                self.prev_gray, gray, all_points, None,
+                winSize=FLOW_WINDOW, maxLevel=FLOW_PYRAMID_LEVELS,
+            )
+            if next_points is None:
+                return None, None
+
+            offset = 0
+            for i in tracked:
+                points = self.points[i]
+                count = len(points)
+                ok = status[offset:offset + count, 0] == 1
+                moved = next_points[offset:offset + count]
+                offset += count
+                if ok.sum() < MIN_FLOW_POINTS:
+                    continue
+
+                shift = np.median(moved[ok, 0] - points[ok, 0], axis=0)
+                batch['center_x'][i] += shift[0]
+                batch['center_y'][i] += shift[1]
+                new_points[i] = moved[ok].reshape(-1, 1, 2)
+                flowed[i] = True
+
+        held = [i for i in range(len(batch)) if not flowed[i]]
+        if held:
+            self.held_tracks += len(held)
+            for i, points in zip(held, self._select_points(gray, batch[held])):
+                new_points[i] = points
+
+        self.points = new_points
+        return batch, flowed
+
+    def _measure_drift(self, propagated, detections):
+        """关键帧上按编号比较光流预测位置与检测位置，返回最大偏差（像素）"""
+        if propagated is None or len(propagated) == 0 or len(detections) == 0:
+            return None
+
+        drift = None
+        for det in detections:
+            same = propagated[propagated['cube_id'] == det['cube_id']]
+            if len(same) == 0:
+                continue
+            error = float(np.hypot(same['center_x'][0] - det['center_x'], same['center_y'][0] - det['center_y']))
+            drift = error if drift is None else max(drift, error)
+        return drift
+
+    def _adapt_interval(self, drift):
+        if drift is None:
+            return
+        self.last_drift = drift
+        if drift > DRIFT_HIGH:
+            self.interval = max(self.min_interval, self.interval // 2)
+        elif drift < DRIFT_LOW:
+            self.interval = min(self.max_interval, self.interval + 1)
+
+    def process(self, frame):
+        """处理一帧，返回 (检测批次, 是否为关键帧)"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        propagated, flowed = self._propagate(gray)
+
+        is_keyframe = (
+            self.force_keyframe
+            or propagated is None
+            or self.frames_since_keyframe + 1 >= self.interval
+        )
+
+        if is_keyframe:
+            detections = self.detect_fn(frame)
+            if propagated is None:
+                # 光流跟踪失败说明运动过快或遮挡，缩短间隔
+                self.interval = max(self.min_interval, self.interval // 2)
+            else:
+                self._adapt_interval(self._measure_drift(propagated[flowed], detections))
+
+            self.batch = detections
+            self.points = self._select_points(gray, detections)
+            self.frames_since_keyframe = 0
+            self.force_keyframe = False
+            self.keyframes += 1
+        else:
+            self.batch = propagated
+            self.frames_since_keyframe += 1
+            self.propagated_frames += 1
+
+        self.prev_gray = gray
+        return self.batch, is_keyframe
+
+    def track(self, frame):
+        """调度器跳过检测的帧：只用光流平移各目标并更新上一帧画面，不运行检测，返回传播后的批次
+
+        保持上一帧画面为最新，下一个推理帧的光流只需跨越一帧的运动。
+        """
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        propagated, _ = self._propagate(gray)
+        if propagated is None:
+            # 光流跟踪失败：在当前帧重新选取特征点，下一个推理帧重新检测
+            self.interval = max(self.min_interval, self.interval // 2)
+            self.points = self._select_points(gray, self.batch)
+            self.force_keyframe = True
+        else:
+            self.batch = propagated
+            self.frames_since_keyframe += 1
+            self.propagated_frames += 1
+
+        self.prev_gray = gray
+        return self.batch
+
+    def reset(self):
+        self.prev_gray = None
+        self.batch = EMPTY_BATCH
+        self.points = []
+        self.force_keyframe = True
+
+    def get_stats(self):
+        total = self.keyframes + self.propagated_frames
+        return {
+            'interval': self.interval,
+            'keyframes': self.keyframes,
+            'propagated_frames': self.propagated_frames,
+            'keyframe_ratio': self.keyframes / total if total else 1.0,
+            'held_tracks': self.held_tracks,
+            'last_drift': self.last_drift,
+        }
@@ -0,0 +1,92 @@
+import importlib.util
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+def lazy_import(name):
+    """延迟导入模块：首次访问其属性时才真正执行导入
+
+    模块（或其依赖）不存在时返回None，调用方据此判断功能是否可用。
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        spec = None
+    if spec is None or spec.loader is None:
+        return None
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def modules_available(*names):
+    """检查一组模块是否都已安装（不执行导入）"""
+    for name in names:
+        try:
+            if importlib.util.find_spec(name) is None:
+                return False
+        except (ImportError, ValueError):
+            return False
+    return True
+
+
+class StartupTimer:
+    """启动耗时统计 - 记录各阶段耗时并与预算对比
+
+    各阶段可能在不同线程中并行执行，因此总耗时按墙钟时间计算，
+    而不是各阶段耗时之和。
+    """
+
+    def __init__(self, budget=None):
+        self.start_time = time.perf_counter()
+        self.budget = dict(budget or {})
+        self.phases = {}
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds):
+        """记录一个阶段的耗时（同名阶段累加，例如蓝牙重试）"""
+        with self.lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        """用 with 语句统计一个阶段的耗时"""
+        phase_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - phase_start)
+
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def report(self, title="启动耗时"):
+        """打印各阶段耗时及是否超出预算"""
+        total = self.elapsed()
+        print(f"\n⏱️  {title}（墙钟时间 {total:.2f}秒）:")
+
+        with self.lock:
+            phases = list(self.phases.items())
+
+        for name, seconds in phases:
+            budget = self.budget.get(name)
+            if budget is None:
+                print(f"   {name}: {seconds:.2f}秒")
+            elif seconds > budget:
+                print(f"   ⚠️  {name}: {seconds:.2f}秒（超出预算 {budget:.1f}秒）")
+            else:
+                print(f"   ✅ {name}: {seconds:.2f}秒（预算 {budget:.1f}秒）")
+
+        total_budget = self.budget.get('总计')
+        if total_budget is not None and total > total_budget:
+            print(f"   ⚠️  总启动时间超出预算 {total_budget:.1f}秒")
+        return total
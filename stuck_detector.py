@@ -0,0 +1,222 @@
+from collections import deque
+
+STUCK_WINDOW = 8.0       # 只统计最近该时间（秒）内的位置样本
+STUCK_MIN_SPAN = 3.0     # 样本至少覆盖该时间（秒）才开始判断卡住
+STUCK_CAPACITY = 128     # 环形缓冲区容量（样本数）
+
+STALL_MIN_COMMAND = 10        # 指令速度低于该值的车轮不参与堵转判断
+STALL_SPEED_RATIO = 0.3       # 实测速度低于指令速度的该比例时视为堵转
+STALL_SETTLE_TIME = 0.25      # 启动、换向或加速后等待电机加速的时间（秒），期间不开始新的堵转计时
+STALL_CONFIRM_TIME = 0.3      # 堵转持续该时间（秒）即判定卡住
+COLLISION_WINDOW = 1.0        # 碰撞通知的有效时间（秒）
+COLLISION_CONFIRM_TIME = 0.1  # 碰撞后堵转持续该时间（秒）即判定卡住
+SPEED_STALE_TIME = 1.0        # 电机速度只在变化时通知，超过该时间（秒）没有新通知时实测速度视为未知
+
+
+class StuckDetector:
+    """基于位置范围的卡住检测（每个toio一个）
+
+    位置样本存放在固定大小的环形缓冲区中，另用四个单调队列维护窗口内 x、y 的最小/最大值，
+    每个样本的更新和查询都是均摊 O(1)，与采样率和窗口长度无关。
+    窗口内的活动范围取外接矩形的对角线（不小于任意两点间的最大距离），
+    小于 distance_threshold 时开始计时，持续超过 time_threshold 即判定卡住。
+    样本间隔小于 window / capacity 时跳过该样本，采样率再高缓冲区也能覆盖整个窗口。
+    """
+
+    def __init__(self, distance_threshold, time_threshold, window=STUCK_WINDOW,
+                 min_span=STUCK_MIN_SPAN, capacity=STUCK_CAPACITY):
+        self.distance_threshold = distance_threshold
+        self.time_threshold = time_threshold
+        self.window = window
+        self.min_span = min_span
+        self.capacity = capacity
+        self.min_interval = window / capacity
+
+        self.times = [0.0] * capacity
+        self.xs = [0.0] * capacity
+        self.ys = [0.0] * capacity
+        self.reset()
+
+    def reset(self):
+        self.start = 0  # 最旧样本的序号（槽位为 序号 % capacity）
+        self.end = 0    # 下一个样本的序号
+        self.min_x = deque()  # 单调队列，存样本序号
+        self.max_x = deque()
+        self.min_y = deque()
+        self.max_y = deque()
+        self.stuck_since = None
+
+    def __len__(self):
+        return self.end - self.start
+
+    def _pop_oldest(self):
+        for queue in (self.min_x, self.max_x, self.min_y, self.max_y):
+            if queue and queue[0] == self.start:
+                queue.popleft()
+        self.start += 1
+
+    def _push(self, queue, values, seq, value, keep):
+        # 队尾中不可能再成为极值的样本出队
+        cap = self.capacity
+        while queue and not keep(values[queue[-1] % cap], value):
+            queue.pop()
+        queue.append(seq)
+
+    def add(self, timestamp, x, y):
+        """加入一个位置样本并更新卡住计时"""
+        cap = self.capacity
+        # 采样过密时跳过该样本（只更新计时），缓冲区始终能覆盖整个窗口
+        if not len(self) or timestamp - self.times[(self.end - 1) % cap] >= self.min_interval:
+            if len(self) == cap:
+                self._pop_oldest()
+            seq = self.end
+            slot = seq % cap
+            self.times[slot] = timestamp
+            self.xs[slot] = x
+            self.ys[slot] = y
+            self._push(self.min_x, self.xs, seq, x, lambda old, new: old < new)
+            self._push(self.max_x, self.xs, seq, x, lambda old, new: old > new)
+            self._push(self.min_y, self.ys, seq, y, lambda old, new: old < new)
+            self._push(self.max_y, self.ys, seq, y, lambda old, new: old > new)
+            self.end += 1
+
+        while len(self) and timestamp - self.times[self.start % cap] > self.window:
+            self._pop_oldest()
+
+        if self.span >= self.min_span and self.extent < self.distance_threshold:
+            if self.stuck_since is None:
+                self.stuck_since = timestamp
+        else:
+            self.stuck_since = None
+
+    @property
+    def span(self):
+        """窗口内样本覆盖的时间（秒）"""
+        if not len(self):
+            return 0.0
+        cap = self.capacity
+        return self.times[(self.end - 1) % cap] - self.times[self.start % cap]
+
+    @property
+    def extent(self):
+        """窗口内的活动范围（外接矩形对角线，像素）"""
+        if not len(self):
+            return 0.0
+        cap = self.capacity
+        width = self.xs[self.max_x[0] % cap] - self.xs[self.min_x[0] % cap]
+        height = self.ys[self.max_y[0] % cap] - self.ys[self.min_y[0] % cap]
+        return (width * width + height * height) ** 0.5
+
+    def stuck_duration(self, now):
+        return now - self.stuck_since if self.stuck_since is not None else 0.0
+
+    def score(self, now):
+        """卡住评分（0~1）：已卡住时长占 time_threshold 的比例，达到1时判定卡住"""
+        return min(self.stuck_duration(now) / self.time_threshold, 1.0)
+
+    def is_stuck(self, now):
+        return self.stuck_since is not None and self.stuck_duration(now) > self.time_threshold
+
+    def get_stats(self, now):
+        return {
+            'samples': len(self),
+            'span': self.span,
+            'extent': self.extent,
+            'stuck_duration': self.stuck_duration(now),
+            'score': self.score(now),
+        }
+
+
+class SensorStallDetector:
+    """基于toio传感器通知的堵转/碰撞检测（每个toio一个）
+
+    记录最近一次电机指令速度和电机速度通知的实测速度：参与判断的车轮实测速度都远低于指令速度时
+    开始计时，持续 STALL_CONFIRM_TIME 判定堵转；刚收到碰撞通知时只需 COLLISION_CONFIRM_TIME。
+    同方向的新指令不会打断已开始的计时（随机移动每0.1~0.5秒就换一次速度），只有从静止启动或换向时
+    重新计时并等待 STALL_SETTLE_TIME；同方向加速时，新的计时不早于加速指令的时间。
+    电机速度只在变化时通知，超过 SPEED_STALE_TIME 的实测速度视为未知；
+    此时（或固件不支持电机速度通知时）碰撞通知与视觉卡住信号同时出现才判定。不需要摄像头看到toio。
+    """
+
+    def __init__(self, confirm_time=STALL_CONFIRM_TIME, collision_confirm_time=COLLISION_CONFIRM_TIME):
+        self.confirm_time = confirm_time
+        self.collision_confirm_time = collision_confirm_time
+
+        self.command = (0, 0)
+        self.settle_until = 0.0  # 该时间之前电机可能仍在加速，不开始新的堵转计时
+        self.speedup_time = 0.0  # 最近一次同方向加速指令的时间，新的堵转计时不早于该时间
+        self.speed = None  # 最近一次实测速度 (左, 右)，没有收到过电机速度通知时为None
+        self.speed_time = None
+        self.collisions = 0
+        self.reset()
+
+    def reset(self):
+        self.stall_since = None
+        self.collision_time = None
+
+    @staticmethod
+    def _restarts(previous, command):
+        """从静止启动，或有车轮反向"""
+        if all(abs(p) < STALL_MIN_COMMAND for p in previous):
+            return True
+        return any(p * c < 0 and abs(p) >= STALL_MIN_COMMAND and abs(c) >= STALL_MIN_COMMAND
+                   for p, c in zip(previous, command))
+
+    def set_command(self, timestamp, left, right):
+        """记录发出的电机指令速度"""
+        previous = self.command
+        command = (left, right)
+        if command == previous:
+            return
+        self.command = command
+        if self._restarts(previous, command):
+            # 启动或换向：重新开始堵转计时，并等待电机加速
+            self.stall_since = None
+            self.settle_until = timestamp + STALL_SETTLE_TIME
+        elif any(abs(c) > abs(p) for c, p in zip(command, previous)):
+            # 同方向加速：已开始的堵转计时继续
+            self.speedup_time = timestamp
+
+    def set_speed(self, timestamp, left, right):
+        """电机速度通知（实测速度）"""
+        self.speed = (left, right)
+        self.speed_time = timestamp
+
+    def set_collision(self, timestamp):
+        """碰撞检测通知"""
+        self.collision_time = timestamp
+        self.collisions += 1
+
+    def is_stalled(self, now):
+        """指令速度足够大，但所有参与判断的车轮实测速度都远低于指令速度；实测速度未知时返回None"""
+        if self.speed is None or now - self.speed_time > SPEED_STALE_TIME:
+            return None
+        wheels = [(abs(c), abs(m)) for c, m in zip(self.command, self.speed) if abs(c) >= STALL_MIN_COMMAND]
+        if not wheels:
+            return False
+        return all(measured < STALL_SPEED_RATIO * commanded for commanded, measured in wheels)
+
+    def check(self, now, vision_stuck=False):
+        """返回判定卡住的原因（'stall' / 'collision'），未卡住返回None"""
+        collided = self.collision_time is not None and now - self.collision_time <= COLLISION_WINDOW
+        stalled = self.is_stalled(now)
+
+        if stalled is None:
+            # 没有可用的电机速度信息：碰撞与视觉卡住信号同时成立
+            self.stall_since = None
+            return 'collision' if collided and vision_stuck else None
+
+        if not stalled:
+            self.stall_since = None
+            return None
+        if self.stall_since is None:
+            if now < self.settle_until:
+                return None
+            # 从速度通知（或加速）的时间开始计时，与检查的频率无关
+            self.stall_since = max(self.speed_time, self.settle_until, self.speedup_time)
+        duration = now - self.stall_since
+        if collided and duration >= self.collision_confirm_time:
+            return 'collision'
+        if duration >= self.confirm_time:
+            return 'stall'
+        return None
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('cv2')
+
+from geofence import NO_ZONE, GeofenceEngine, circle_zone, ring_zone  # noqa: E402
+
+SHAPE = (200, 200, 3)
+
+
+def step(engine, cube_id, x, y, timestamp):
+    zones, events = engine.update([cube_id], [x], [y], timestamp, SHAPE)
+    return int(zones[0]), [(e.kind, e.zone) for e in events]
+
+
+def test_enter_and_exit_single_zone():
+    engine = GeofenceEngine([circle_zone('circle', (100, 100), 50)], hysteresis=4)
+    assert step(engine, 0, 100, 100, 0.0) == (1, [])
+    zone, events = step(engine, 0, 180, 100, 1.0)
+    assert zone == NO_ZONE
+    assert events == [('exit', 'circle')]
+    zone, events = step(engine, 0, 100, 100, 2.0)
+    assert zone == 1
+    assert events == [('enter', 'circle')]
+
+
+def test_boundary_jitter_does_not_toggle():
+    engine = GeofenceEngine([circle_zone('circle', (100, 100), 50)], hysteresis=4)
+    step(engine, 0, 100, 100, 0.0)
+    # 在边界外 1~3 像素来回抖动：仍在外扩范围内，不触发离开
+    for i, x in enumerate([148, 152, 149, 153, 150, 152]):
+        zone, events = step(engine, 0, x, 100, 1.0 + i)
+        assert zone == 1
+        assert events == []
+    zone, events = step(engine, 0, 160, 100, 10.0)
+    assert events == [('exit', 'circle')]
+
+
+def test_nested_zone_can_be_entered_from_outer_zone():
+    engine = GeofenceEngine([
+        circle_zone('arena', (100, 100), 80),
+        circle_zone('goal', (100, 100), 20),
+    ], hysteresis=4)
+    assert step(engine, 0, 100, 50, 0.0) == (1, [])
+
+    zone, events = step(engine, 0, 100, 90, 1.0)
+    assert zone == 2
+    assert events == [('exit', 'arena'), ('enter', 'goal')]
+
+    # 在内圈边界附近抖动：仍保持在内圈
+    for i, y in enumerate([121, 123, 119, 122]):
+        zone, events = step(engine, 0, 100, y, 2.0 + i)
+        assert zone == 2
+        assert events == []
+
+    # 越过内圈滞回范围，回到外圈
+    zone, events = step(engine, 0, 100, 130, 10.0)
+    assert zone == 1
+    assert events == [('exit', 'goal'), ('enter', 'arena')]
+
+
+def test_ring_inside_circle_overrides_outer_zone():
+    engine = GeofenceEngine([
+        circle_zone('circle', (100, 100), 80),
+        ring_zone('ring', (100, 100), 30, 50),
+    ], hysteresis=4)
+    step(engine, 0, 100, 100, 0.0)
+    zone, events = step(engine, 0, 140, 100, 1.0)
+    assert zone == 2
+    assert events == [('exit', 'circle'), ('enter', 'ring')]
+    # 离开圆环进入中心，回到外圈区域
+    zone, events = step(engine, 0, 100, 100, 2.0)
+    assert zone == 1
+    assert events == [('exit', 'ring'), ('enter', 'circle')]
+
+
+def test_dwell_fires_once():
+    engine = GeofenceEngine([circle_zone('circle', (100, 100), 50, dwell_time=1.0)], hysteresis=4)
+    step(engine, 0, 100, 100, 0.0)
+    assert step(engine, 0, 100, 100, 0.5)[1] == []
+    assert step(engine, 0, 100, 100, 1.2)[1] == [('dwell', 'circle')]
+    assert step(engine, 0, 100, 100, 3.0)[1] == []
+
+
+def test_predict_exits_fires_once_and_rearms():
+    engine = GeofenceEngine([circle_zone('circle', (100, 100), 50)], hysteresis=4)
+    step(engine, 0, 130, 100, 0.0)
+
+    events = engine.predict_exits([0], [130], [100], [100.0], [0.0], 0.3, 0.0)
+    assert [e.kind for e in events] == ['pre_exit']
+    assert events[0].zone == 'circle'
+    assert 0.0 < events[0].time_to_exit <= 0.3
+
+    # 仍预计离开：不重复触发
+    assert engine.predict_exits([0], [131], [100], [100.0], [0.0], 0.3, 0.1) == []
+    # 不再预计离开且超过重新触发时间后可以再次触发
+    assert engine.predict_exits([0], [100], [100], [0.0], [0.0], 0.3, 2.0) == []
+    events = engine.predict_exits([0], [130], [100], [100.0], [0.0], 0.3, 2.1)
+    assert [e.kind for e in events] == ['pre_exit']
+
+
+def test_predict_exits_ignores_still_cube_in_hysteresis_band():
+    engine = GeofenceEngine([circle_zone('circle', (100, 100), 50)], hysteresis=4)
+    step(engine, 0, 100, 100, 0.0)
+    # 静止在边界外的滞回带内：区域状态保持不变，也不预测离开
+    assert step(engine, 0, 152, 100, 0.5) == (1, [])
+    assert engine.predict_exits([0], [152], [100], [0.0], [0.0], 0.3, 1.0) == []
+    # 向外移动超出滞回带时仍会预测离开
+    events = engine.predict_exits([0], [152], [100], [100.0], [0.0], 0.3, 1.1)
+    assert [e.kind for e in events] == ['pre_exit']
+
+
+def test_predict_exits_ignores_slow_and_unknown_cubes():
+    engine = GeofenceEngine([circle_zone('circle', (100, 100), 50)], hysteresis=4)
+    step(engine, 0, 100, 100, 0.0)
+    assert engine.predict_exits([0], [100], [100], [10.0], [0.0], 0.3, 0.1) == []
+    assert engine.predict_exits([5], [130], [100], [100.0], [0.0], 0.3, 0.1) == []
+    assert engine.predict_exits(np.zeros(0, dtype=int), [], [], [], [], 0.3, 0.1) == []
@@ -0,0 +1,209 @@
+import itertools
+import random
+
+from stuck_detector import (
+    COLLISION_CONFIRM_TIME,
+    COLLISION_WINDOW,
+    SPEED_STALE_TIME,
+    STALL_CONFIRM_TIME,
+    STALL_SETTLE_TIME,
+    SensorStallDetector,
+    StuckDetector,
+)
+
+
+def window_samples(detector):
+    cap = detector.capacity
+    return [
+        (detector.times[i % cap], detector.xs[i % cap], detector.ys[i % cap])
+        for i in range(detector.start, detector.end)
+    ]
+
+
+def brute_force_extent(samples):
+    xs = [x for _, x, _ in samples]
+    ys = [y for _, _, y in samples]
+    width = max(xs) - min(xs)
+    height = max(ys) - min(ys)
+    return (width * width + height * height) ** 0.5
+
+
+def test_extent_matches_brute_force():
+    rng = random.Random(1)
+    detector = StuckDetector(5, 6.0)
+    timestamp = 0.0
+    for k in range(2000):
+        timestamp += rng.uniform(0.01, 0.2)
+        spread = 4 if k % 500 < 300 else 40
+        detector.add(timestamp, rng.uniform(0, spread), rng.uniform(0, 3))
+
+        samples = window_samples(detector)
+        assert abs(detector.extent - brute_force_extent(samples)) < 1e-9
+        assert timestamp - samples[0][0] <= detector.window
+        assert len(detector) <= detector.capacity
+
+        # 外接矩形对角线不小于任意两点间的最大距离
+        max_pair = max(
+            (((a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2) ** 0.5 for a, b in itertools.combinations(samples, 2)),
+            default=0.0,
+        )
+        assert max_pair <= detector.extent + 1e-9
+
+
+def test_dense_samples_still_cover_window():
+    detector = StuckDetector(5, 6.0, window=8.0, capacity=16)
+    for k in range(2000):
+        detector.add(k * 0.01, 0, 0)
+    # 采样率远高于 capacity / window 时缓冲区仍覆盖接近整个窗口
+    assert len(detector) <= 16
+    assert detector.span > 7.0
+
+
+def test_stuck_timing_and_score():
+    detector = StuckDetector(5, 6.0, window=8.0, min_span=3.0)
+    timestamp = 0.0
+    while timestamp < 2.9:
+        detector.add(timestamp, 100, 100)
+        timestamp += 0.1
+    # 样本覆盖不足 min_span 时不开始计时
+    assert detector.stuck_since is None
+    assert detector.score(timestamp) == 0.0
+
+    while timestamp < 12.0:
+        detector.add(timestamp, 100 + (timestamp * 10) % 2, 100)
+        timestamp += 0.1
+    assert detector.stuck_since is not None
+    assert 0.0 < detector.score(timestamp) <= 1.0
+    assert detector.is_stuck(timestamp)
+
+    # 明显移动后重置计时
+    detector.add(timestamp, 150, 100)
+    assert detector.stuck_since is None
+    assert not detector.is_stuck(timestamp)
+
+
+def test_reset_clears_window():
+    detector = StuckDetector(5, 6.0)
+    for k in range(50):
+        detector.add(k * 0.1, k, k)
+    detector.reset()
+    assert len(detector) == 0
+    assert detector.extent == 0.0
+    assert detector.span == 0.0
+    assert detector.stuck_since is None
+
+
+def simulate_random_drive(detector, start, duration, rng, speed_fn, vision_stuck=False, check_interval=0.03):
+    """按随机移动的节奏（每0.1~0.4秒换一次同方向速度）发指令，返回第一次判定卡住的时间和原因"""
+    timestamp = start
+    next_command = start
+    while timestamp < start + duration:
+        if timestamp >= next_command:
+            base = rng.randint(15, 40)
+            offset = rng.randint(-10, 10)
+            detector.set_command(timestamp, base + offset, base - offset)
+            next_command = timestamp + rng.uniform(0.1, 0.4)
+        speed = speed_fn(timestamp)
+        if speed is not None:
+            detector.set_speed(timestamp, *speed)
+        reason = detector.check(timestamp, vision_stuck)
+        if reason is not None:
+            return timestamp, reason
+        timestamp += check_interval
+    return None, None
+
+
+def test_stall_detected_while_commands_keep_changing():
+    rng = random.Random(2)
+    for trial in range(20):
+        detector = SensorStallDetector()
+        # 实测速度为0：只在撞墙时通知一次（速度变化时才通知）
+        notified = []
+
+        def speed_fn(timestamp):
+            if not notified and timestamp >= 1.0:
+                notified.append(timestamp)
+                return (0, 0)
+            return None
+
+        detector.set_speed(0.0, 30, 30)
+        detected_at, reason = simulate_random_drive(detector, 1.0, 3.0, rng, speed_fn)
+        assert reason == 'stall'
+        assert detected_at - 1.0 < STALL_SETTLE_TIME + STALL_CONFIRM_TIME + 0.1
+
+
+def test_no_stall_when_wheels_follow_commands():
+    rng = random.Random(3)
+    detector = SensorStallDetector()
+
+    def speed_fn(timestamp):
+        left, right = detector.command
+        return (abs(left), abs(right))
+
+    detected_at, reason = simulate_random_drive(detector, 0.0, 10.0, rng, speed_fn)
+    assert reason is None
+
+
+def test_infrequent_checks_use_notification_time():
+    detector = SensorStallDetector()
+    detector.set_command(0.0, 30, 30)
+    detector.set_speed(1.0, 0, 0)
+    # 控制循环0.5秒才检查一次：从速度通知的时间开始计时
+    assert detector.check(1.5) == 'stall'
+
+
+def test_reversal_restarts_stall_timer():
+    detector = SensorStallDetector()
+    detector.set_command(0.0, 30, 30)
+    detector.set_speed(0.5, 0, 0)
+    assert detector.check(0.6) is None
+    detector.set_command(0.7, -30, -30)
+    assert detector.stall_since is None
+    assert detector.check(0.8) is None
+    assert detector.check(0.7 + STALL_SETTLE_TIME + STALL_CONFIRM_TIME + 0.01) == 'stall'
+
+
+def test_stale_speed_is_unknown():
+    detector = SensorStallDetector()
+    detector.set_command(0.0, 30, 30)
+    detector.set_speed(0.0, 0, 0)
+    assert detector.is_stalled(SPEED_STALE_TIME + 0.1) is None
+    assert detector.check(SPEED_STALE_TIME + 0.1) is None
+
+
+def test_collision_shortens_confirmation():
+    detector = SensorStallDetector()
+    detector.set_command(0.0, 30, 30)
+    detector.set_speed(1.0, 0, 0)
+    detector.set_collision(1.0)
+    assert detector.check(1.0) is None
+    assert detector.check(1.0 + COLLISION_CONFIRM_TIME) == 'collision'
+
+
+def test_collision_without_speed_needs_vision():
+    detector = SensorStallDetector()
+    detector.set_command(0.0, 30, 30)
+    detector.set_collision(1.0)
+    assert detector.check(1.1) is None
+    assert detector.check(1.1, vision_stuck=True) == 'collision'
+    assert detector.check(1.0 + COLLISION_WINDOW + 0.1, vision_stuck=True) is None
+
+
+def test_stopped_cube_is_never_stalled():
+    detector = SensorStallDetector()
+    detector.set_command(0.0, 0, 0)
+    detector.set_speed(0.0, 0, 0)
+    assert detector.check(0.5) is None
+
+
+def test_speedup_does_not_count_old_reading_as_stall():
+    detector = SensorStallDetector()
+    detector.set_command(0.0, 12, 12)
+    detector.set_speed(0.3, 12, 12)
+    assert detector.check(0.5) is None
+    # 加速指令发出后，旧的实测速度暂时低于指令速度：计时从加速时间开始
+    detector.set_command(0.6, 50, 50)
+    assert detector.check(0.65) is None
+    detector.set_speed(0.7, 48, 47)
+    assert detector.check(0.75) is None
+    assert detector.stall_since is None
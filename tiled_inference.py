@@ -0,0 +1,94 @@
+import math
+
+import cv2
+import numpy as np
+
+from inference_worker import EMPTY_DETECTIONS
+
+TILE_OVERLAP = 0.2          # 相邻切片的重叠比例，保证跨切片边界的目标至少在一个切片中完整出现
+TILE_NMS_THRESHOLD = 0.5    # 两个旋转框的交集占较小框面积的比例超过该值时只保留置信度高的
+
+
+def tile_positions(start, end, tile_size, overlap=TILE_OVERLAP):
+    """沿一个方向均匀排布切片起点，首尾切片贴齐区域边界"""
+    length = end - start
+    if length <= tile_size:
+        return [start]
+    step = tile_size * (1 - overlap)
+    count = int(math.ceil((length - tile_size) / step)) + 1
+    return [int(round(p)) for p in np.linspace(start, end - tile_size, count)]
+
+
+def tile_grid(roi, tile_size, overlap=TILE_OVERLAP):
+    """把区域 (x0, y0, x1, y1) 切分为互相重叠、尺寸相同的切片列表"""
+    x0, y0, x1, y1 = roi
+    tile_w = min(tile_size, x1 - x0)
+    tile_h = min(tile_size, y1 - y0)
+    return [
+        (x, y, x + tile_w, y + tile_h)
+        for y in tile_positions(y0, y1, tile_h, overlap)
+        for x in tile_positions(x0, x1, tile_w, overlap)
+    ]
+
+
+def merge_tile_detections(tile_arrays, tiles):
+    """把各切片的 N×7 检测平移回整帧坐标并合并"""
+    merged = []
+    for det_array, (x0, y0, _, _) in zip(tile_arrays, tiles):
+        if len(det_array) == 0:
+            continue
+        det_array = det_array.copy()
+        det_array[:, 0] += x0
+        det_array[:, 1] += y0
+        merged.append(det_array)
+
+    if not merged:
+        return EMPTY_DETECTIONS
+    return np.concatenate(merged, axis=0)
+
+
+def rotated_nms(det_array, threshold=TILE_NMS_THRESHOLD):
+    """旋转框非极大值抑制（类别无关，与推理时的agnostic_nms一致）
+
+    切片边界处被截断的目标只剩半个框，与完整框的IoU不高，
+    因此按“交集 / 较小框面积”判断重叠，截断框会被完整框抑制。
+    """
+    if len(det_array) <= 1:
+        return det_array
+
+    order = np.argsort(-det_array[:, 5])
+    det_array = det_array[order]
+    # 推理输出的角度为弧度，OpenCV旋转矩形使用角度制
+    rects = [((d[0], d[1]), (d[2], d[3]), math.degrees(d[4])) for d in det_array]
+    areas = det_array[:, 2] * det_array[:, 3]
+    radius = np.hypot(det_array[:, 2], det_array[:, 3]) / 2
+
+    keep = []
+    for i in range(len(det_array)):
+        suppressed = False
+        for k in keep:
+            # 外接圆不相交的框不可能重叠，跳过较慢的多边形求交
+            if np.hypot(det_array[i, 0] - det_array[k, 0], det_array[i, 1] - det_array[k, 1]) > radius[i] + radius[k]:
+                continue
+            ret, points = cv2.rotatedRectangleIntersection(rects[i], rects[k])
+            if ret == cv2.INTERSECT_NONE or points is None:
+                continue
+            inter = cv2.contourArea(cv2.convexHull(points))
+            if inter / max(min(areas[i], areas[k]), 1e-6) > threshold:
+                suppressed = True
+                break
+        if not suppressed:
+            keep.append(i)
+
+    return det_array[keep]
+
+
+def predict_tiled(frame, roi, tile_size, predict_batch, overlap=TILE_OVERLAP):
+    """切片推理：把区域切成重叠切片，整批推理后合并并做旋转框NMS
+
+    predict_batch(切片列表) 返回与切片一一对应的 N×7 检测数组列表。
+    """
+    tiles = tile_grid(roi, tile_size, overlap)
+    crops = [frame[y0:y1, x0:x1] for x0, y0, x1, y1 in tiles]
+    tile_arrays = predict_batch(crops)
+    return rotated_nms(merge_tile_detections(tile_arrays, tiles))
@@ -0,0 +1,206 @@
+"""CPU推理配置自动调优
+
+在本机上逐一测试 推理后端 × 推理尺寸 × 线程数 的组合，
+选出达到目标帧率且CPU占用最低的配置，写入性能配置文件；
+initialize_model / initialize_camera 启动时会自动加载该配置。
+
+每种配置在新的子进程中测试：torch的inter-op线程数每个进程只能设置一次，CPU亲和性也不应影响后续配置。
+torch后端的“线程数”是torch线程数（同时绑定相同数量的核心）；ONNX Runtime / OpenVINO 不使用torch的线程池，
+它们的“线程数”只通过CPU亲和性限制可用核心数，配置文件中按核心数记录。
+
+用法:
+    python tune_inference.py                              # 使用合成画面
+    python tune_inference.py --frames recordings/session1 # 使用录制画面（图片目录或视频）
+    python tune_inference.py --backends torch,onnx --imgsz 640,416 --fps-target 20
+"""
+import argparse
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+import combined_yolo_toio_control as app
+from inference_backends import INFERENCE_BACKENDS, is_backend_available, load_inference_model, model_file_hash
+from inference_profile import save_profile
+from inference_worker import pin_inference_threads
+from model_quantization import load_frames
+
+WARMUP_FRAMES = 3
+
+
+def synthetic_frames(width, height, count=30, seed=0):
+    """生成带随机旋转方块的合成画面（没有录制画面时使用）"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(count):
+        frame = np.full((height, width, 3), 200, dtype=np.uint8)
+        frame += rng.integers(0, 20, frame.shape, dtype=np.uint8)
+        for _ in range(4):
+            center = (float(rng.uniform(0, width)), float(rng.uniform(0, height)))
+            size = float(rng.uniform(20, 40))
+            box = cv2.boxPoints((center, (size, size), float(rng.uniform(0, 90)))).astype(np.int32)
+            cv2.fillPoly(frame, [box], tuple(int(c) for c in rng.integers(0, 255, 3)))
+        frames.append(frame)
+    return frames
+
+
+def default_thread_counts():
+    """1, 2, 4, ... 直到CPU核心数"""
+    cpu_count = os.cpu_count() or 1
+    counts = []
+    threads = 1
+    while threads < cpu_count:
+        counts.append(threads)
+        threads *= 2
+    counts.append(cpu_count)
+    return counts
+
+
+def benchmark(model_path, backend, imgsz, threads, frames, runs):
+    """测试一种配置，返回测量结果；后端不可用时返回None（需在新进程中调用，见 benchmark_isolated）"""
+    cores = list(range(threads)) if hasattr(os, 'sched_setaffinity') else None
+    # 非torch后端只能通过CPU亲和性限制核心数，torch线程数保持默认
+    pin_inference_threads(threads if backend == 'torch' else None, cores)
+
+    overrides = {
+        'verbose': False,
+        'device': 'cpu',
+        'half': False,
+        'agnostic_nms': True,
+        'max_det': 50,
+    }
+    model, actual_backend = load_inference_model(model_path, backend, imgsz, overrides)
+    if actual_backend != backend:
+        return None
+
+    def predict(frame):
+        model.predict(source=frame, imgsz=imgsz, conf=app.CONF_THRESHOLD, verbose=False)
+
+    for frame in frames[:WARMUP_FRAMES]:
+        predict(frame)
+
+    latencies = []
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    for i in range(runs):
+        start_time = time.perf_counter()
+        predict(frames[i % len(frames)])
+        latencies.append((time.perf_counter() - start_time) * 1000)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    return {
+        'fps': runs / wall,
+        'cpu_per_frame_ms': cpu / runs * 1000,
+        'cpu_cores_used': cpu / wall,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p90_ms': float(np.percentile(latencies, 90)),
+    }
+
+
+def benchmark_isolated(model_path, backend, imgsz, threads, frames, runs):
+    """在新的子进程中测试一种配置，线程池和CPU亲和性不会遗留到下一种配置"""
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(benchmark, model_path, backend, imgsz, threads, frames, runs).result()
+
+
+def choose_best(results, fps_target):
+    """达到目标帧率的配置中选CPU占用最低的；都达不到时选帧率最高的"""
+    meeting = [r for r in results if r['measured']['fps'] >= fps_target]
+    if meeting:
+        return min(meeting, key=lambda r: r['measured']['cpu_per_frame_ms']), True
+    return max(results, key=lambda r: r['measured']['fps']), False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU推理配置自动调优")
+    parser.add_argument('--frames', help="录制画面：图片目录或视频文件（默认使用合成画面）")
+    parser.add_argument('--model', default=app.MODEL_PATH)
+    parser.add_argument('--backends', default=','.join(INFERENCE_BACKENDS), help="逗号分隔，未安装的后端自动跳过")
+    parser.add_argument('--imgsz', default=','.join(str(s) for s in app.IMGSZ_LADDER))
+    parser.add_argument('--threads', help="逗号分隔的线程数（torch为线程数，其他后端为绑定的核心数；默认 1,2,4,...,核心数）")
+    parser.add_argument('--fps-target', type=float, default=app.CAMERA_FPS)
+    parser.add_argument('--width', type=int, default=app.CAMERA_WIDTH, help="摄像头画面宽度")
+    parser.add_argument('--height', type=int, default=app.CAMERA_HEIGHT, help="摄像头画面高度")
+    parser.add_argument('--runs', type=int, default=60, help="每种配置测试的帧数")
+    parser.add_argument('--output', default=app.INFERENCE_PROFILE_PATH)
+    args = parser.parse_args()
+
+    if args.frames:
+        frames = load_frames(args.frames, max_frames=100)
+        if not frames:
+            print(f"❌ 没有读取到画面: {args.frames}")
+            return 2
+    else:
+        frames = synthetic_frames(args.width, args.height)
+    print(f"📂 测试画面 {len(frames)} 帧（{frames[0].shape[1]}×{frames[0].shape[0]}）")
+
+    backends = [b for b in args.backends.split(',') if b == 'torch' or is_backend_available(b)]
+    sizes = [int(s) for s in args.imgsz.split(',')]
+    thread_counts = [int(t) for t in args.threads.split(',')] if args.threads else default_thread_counts()
+
+    results = []
+    for backend in backends:
+        for imgsz in sizes:
+            for threads in thread_counts:
+                unit = '线程' if backend == 'torch' else '核心'
+                try:
+                    measured = benchmark_isolated(args.model, backend, imgsz, threads, frames, args.runs)
+                except Exception as e:
+                    print(f"   ⚠️  {backend} / {imgsz} / {threads}{unit} 测试失败: {e}")
+                    continue
+                if measured is None:
+                    continue
+                print(f"   {backend:<10} imgsz {imgsz:<4} {unit} {threads:<3} | {measured['fps']:6.1f} FPS | "
+                      f"CPU {measured['cpu_per_frame_ms']:7.1f} ms/帧 | p90 {measured['p90_ms']:6.1f} ms")
+                results.append({
+                    'backend': backend,
+                    'imgsz': imgsz,
+                    'threads': threads,
+                    'torch_threads': threads if backend == 'torch' else None,
+                    'measured': measured,
+                })
+
+    if not results:
+        print("❌ 没有可用的配置")
+        return 1
+
+    best, met = choose_best(results, args.fps_target)
+    unit = '线程' if best['backend'] == 'torch' else '核心'
+    print(f"\n{'✅' if met else '⚠️ '} 选定配置: {best['backend']} / imgsz {best['imgsz']} / {best['threads']}{unit} "
+          f"（{best['measured']['fps']:.1f} FPS，目标 {args.fps_target:.0f} FPS）")
+    if not met:
+        print("   没有配置达到目标帧率，已选择帧率最高的配置；可考虑开启稀疏推理或多进程推理")
+
+    cpu_count = os.cpu_count() or 1
+    threads = best['threads']
+    profile = {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'host': platform.node(),
+        'cpu_count': cpu_count,
+        'model_hash': model_file_hash(args.model),
+        'inference': {
+            'backend': best['backend'],
+            'imgsz': best['imgsz'],
+            'torch_threads': best['torch_threads'],  # 非torch后端为None（只绑定核心）
+            'cpu_cores': list(range(threads)) if threads < cpu_count else None,
+        },
+        'camera': {
+            'width': args.width,
+            'height': args.height,
+            'fps': args.fps_target,
+        },
+        'measured': best['measured'],
+    }
+    save_profile(profile, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
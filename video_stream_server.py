@@ -1,67 +1,102 @@
-from flask import Flask, Response, render_template_string
+from flask import Flask, Response, jsonify, render_template_string
 from flask_cors import CORS
 import cv2
 import threading
 import time
-import queue
+from collections import deque
 import numpy as np
 
+from detection_batch import EMPTY_BATCH, to_json
+from frame_pool import PooledFrame, frame_array, release_frame
+
 app = Flask(__name__)
 CORS(app)  # 允许跨域访问
 
 # 全局变量
-latest_frame = None
+latest_frame = None  # 最新检测画面（PooledFrame 或数组，只保存引用，不复制）
+frame_version = 0  # 每次更新画面加1，用于判断是否需要重新编码
 frame_lock = threading.Lock()
-frame_queue = queue.Queue(maxsize=2)
+latest_detections = (EMPTY_BATCH, 0, 0.0)  # (检测批次, 帧序号, 时间戳)，整体替换，无需加锁
+stream_clients = 0  # 当前连接的视频流客户端数
+clients_lock = threading.Lock()
+stop_handler = None  # 主程序注册的退出回调（无显示器时通过 /stop 接口退出）
+frame_pool_stats = None  # 主程序注册的回调，返回采集帧缓冲池的统计（分配/复用次数），显示在 /status 中
+recent_events = deque(maxlen=100)  # 最近的电子围栏事件（由事件总线回调追加）
+events_lock = threading.Lock()  # 回调线程追加、Flask线程复制时都要持有，避免迭代时deque被修改
 
 class VideoStreamServer:
     def __init__(self):
-        self.frame = None
-        self.lock = threading.Lock()
+        self.jpeg = None
+        self.jpeg_version = -1
+        self.encode_lock = threading.Lock()
+        self.frames_encoded = 0
         
     def update_frame(self, frame):
-        """更新最新的检测画面"""
-        global latest_frame
+        """更新最新的检测画面（只保存引用；PooledFrame 会被持有到下一帧替换它为止）"""
+        global latest_frame, frame_version
+        if isinstance(frame, PooledFrame):
+            frame.retain()
         with frame_lock:
-            latest_frame = frame.copy()
-            
-        # 非阻塞方式更新队列
-        try:
-            if not frame_queue.full():
-                frame_queue.put(frame.copy(), block=False)
-        except:
-            pass
+            previous = latest_frame
+            latest_frame = frame
+            frame_version += 1
+        release_frame(previous)
     
     def get_frame(self):
-        """获取最新画面并编码为JPEG"""
-        global latest_frame
-        
-        if latest_frame is None:
-            # 创建一个黑色画面作为默认
-            frame = np.zeros((480, 640, 3), dtype=np.uint8)
-            cv2.putText(frame, 'Waiting for YOLO stream...', (50, 240), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-        else:
+        """获取最新画面的JPEG，返回 (版本号, JPEG字节)
+
+        每帧只编码一次，所有客户端共享同一份编码结果。
+        """
+        with self.encode_lock:
             with frame_lock:
-                frame = latest_frame.copy()
-        
-        # 编码为JPEG
-        ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-        if ret:
-            return buffer.tobytes()
-        return None
+                frame, version = latest_frame, frame_version
+                if isinstance(frame, PooledFrame):
+                    frame.retain()
+            if version == self.jpeg_version:
+                release_frame(frame)
+                return self.jpeg_version, self.jpeg
+            
+            try:
+                if frame is None:
+                    # 创建一个黑色画面作为默认
+                    image = np.zeros((480, 640, 3), dtype=np.uint8)
+                    cv2.putText(image, 'Waiting for YOLO stream...', (50, 240), 
+                               cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+                else:
+                    image = frame_array(frame)
+                
+                # 编码为JPEG
+                ret, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 85])
+            finally:
+                release_frame(frame)
+            
+            if ret:
+                self.jpeg = buffer.tobytes()
+                self.jpeg_version = version
+                self.frames_encoded += 1
+            return self.jpeg_version, self.jpeg
 
 # 创建视频流服务器实例
 video_server = VideoStreamServer()
 
 def generate_frames():
-    """生成视频流"""
-    while True:
-        frame_bytes = video_server.get_frame()
-        if frame_bytes:
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        time.sleep(0.033)  # 约30FPS
+    """生成视频流（客户端断开时生成器被关闭，连接数随之减少）"""
+    global stream_clients
+    with clients_lock:
+        stream_clients += 1
+    sent_version = None
+    try:
+        while True:
+            version, frame_bytes = video_server.get_frame()
+            # 画面没有更新时不重复发送
+            if frame_bytes and version != sent_version:
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+                sent_version = version
+            time.sleep(0.033)  # 约30FPS
+    finally:
+        with clients_lock:
+            stream_clients -= 1
 
 @app.route('/video_feed')
 def video_feed():
@@ -69,6 +104,28 @@ def video_feed():
     return Response(generate_frames(),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
+@app.route('/detections')
+def detections():
+    """最新一帧的检测结果（JSON）"""
+    batch, frame_seq, timestamp = latest_detections
+    return Response(to_json(batch, frame_seq=frame_seq, timestamp=timestamp),
+                    mimetype='application/json')
+
+@app.route('/events')
+def events():
+    """最近的电子围栏事件（进入/离开/停留/预计离开）"""
+    with events_lock:
+        events = recent_events.copy()
+    return jsonify([event._asdict() for event in events])
+
+@app.route('/stop', methods=['POST'])
+def stop():
+    """请求主程序安全退出"""
+    if stop_handler is None:
+        return jsonify({'stopping': False, 'error': 'no stop handler registered'}), 503
+    stop_handler()
+    return jsonify({'stopping': True})
+
 @app.route('/status')
 def status():
     """状态检查端点"""
@@ -77,6 +134,9 @@ def status():
     return {
         'status': 'active' if has_frame else 'waiting',
         'has_frame': has_frame,
+        'clients': stream_clients,
+        'frames_encoded': video_server.frames_encoded,
+        'frame_pool': frame_pool_stats() if frame_pool_stats is not None else None,
         'timestamp': time.time()
     }
 
@@ -106,14 +166,45 @@ def index():
 
 # 提供给外部调用的函数
 def update_detection_frame(frame):
-    """供YOLO程序调用，更新检测画面"""
+    """供YOLO程序调用，更新检测画面（只保存引用，调用后不应再修改该画面）"""
     video_server.update_frame(frame)
 
+def update_detections(batch, frame_seq=0, timestamp=None):
+    """供YOLO程序调用，更新最新检测批次（只保存引用，序列化在请求时进行）"""
+    global latest_detections
+    latest_detections = (batch, frame_seq, time.time() if timestamp is None else timestamp)
+
+def add_event(event):
+    """事件总线回调：追加到 /events 的列表中（不复制事件对象）"""
+    with events_lock:
+        recent_events.append(event)
+
+def subscribe_events(bus):
+    """订阅主程序的事件总线，事件到达时直接追加到 /events 的列表中（不轮询）"""
+    return bus.subscribe_callback(add_event)
+
+def set_stop_handler(handler):
+    """注册 /stop 接口调用的退出回调"""
+    global stop_handler
+    stop_handler = handler
+
+def set_frame_pool_stats(provider):
+    """注册返回帧缓冲池统计的回调（采集未启动时回调返回None）"""
+    global frame_pool_stats
+    frame_pool_stats = provider
+
+def get_client_count():
+    """当前正在观看视频流的客户端数"""
+    return stream_clients
+
 def start_server(host='localhost', port=5000, debug=False):
     """启动视频流服务器"""
     print(f"🎥 视频流服务器启动在 http://{host}:{port}")
     print(f"📺 视频流地址: http://{host}:{port}/video_feed")
     print(f"🔍 测试页面: http://{host}:{port}/")
+    print(f"📊 检测结果: http://{host}:{port}/detections")
+    print(f"📍 区域事件: http://{host}:{port}/events")
+    print(f"⏹️  退出程序: POST http://{host}:{port}/stop")
     app.run(host=host, port=port, debug=debug, threaded=True)
 
 if __name__ == '__main__':
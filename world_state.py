@@ -0,0 +1,96 @@
+import asyncio
+from collections import namedtuple
+from types import MappingProxyType
+
+CubeState = namedtuple('CubeState', ['cube_id', 'x', 'y', 'angle', 'velocity_x', 'velocity_y', 'predicted', 'zone'])
+CubeState.__doc__ = """单个toio在某一帧的状态（predicted 为 True 表示本帧未检测到，位姿为跟踪器预测值）"""
+
+WorldSnapshot = namedtuple('WorldSnapshot', ['seq', 'timestamp', 'cubes'])
+WorldSnapshot.__doc__ = """一帧的世界状态快照：seq 单调递增，timestamp 为画面采集时间，cubes 为只读的 {cube_id: CubeState}
+
+不在 cubes 中的toio本帧不可见。快照创建后不再修改，可在线程间直接共享。
+"""
+
+EMPTY_SNAPSHOT = WorldSnapshot(0, 0.0, MappingProxyType({}))
+
+
+def make_snapshot(seq, timestamp, tracks, zones=None):
+    """由跟踪结果（TRACK_DTYPE 批次）和各目标所在区域名称构建快照"""
+    if zones is None:
+        zones = [None] * len(tracks)
+    cubes = {
+        cube_id: CubeState(cube_id, x, y, angle, vx, vy, predicted, zone)
+        for cube_id, x, y, angle, vx, vy, predicted, zone in zip(
+            tracks['cube_id'].tolist(), tracks['center_x'].tolist(), tracks['center_y'].tolist(),
+            tracks['angle'].tolist(), tracks['velocity_x'].tolist(), tracks['velocity_y'].tolist(),
+            tracks['coasting'].tolist(), zones,
+        )
+    }
+    return WorldSnapshot(seq, timestamp, MappingProxyType(cubes))
+
+
+class WorldState:
+    """世界状态快照的发布者
+
+    检测线程每帧调用 publish()，快照通过 call_soon_threadsafe 交给事件循环：
+    先同步调用所有 listener（在事件循环线程中更新控制器状态，不再跨线程修改），
+    再唤醒所有 await next() 的控制循环。
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.latest = EMPTY_SNAPSHOT
+        self.listeners = []
+        self.waiter = None
+        self.seq = 0  # 检测线程使用的快照序号
+
+    def attach(self, loop=None):
+        """绑定事件循环（在事件循环中调用）"""
+        self.loop = loop or asyncio.get_running_loop()
+
+    def add_listener(self, listener):
+        """listener(snapshot) 在事件循环线程中、唤醒控制循环之前被调用"""
+        self.listeners.append(listener)
+
+    def publish_tracks(self, timestamp, tracks, zones=None):
+        """由检测线程调用：构建并发布本帧快照"""
+        self.seq += 1
+        snapshot = make_snapshot(self.seq, timestamp, tracks, zones)
+        self.publish(snapshot)
+        return snapshot
+
+    def publish(self, snapshot):
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._set, snapshot)
+        except RuntimeError:
+            pass  # 事件循环已关闭（程序退出中）
+
+    def _set(self, snapshot):
+        if snapshot.seq <= self.latest.seq:
+            return
+        self.latest = snapshot
+        for listener in self.listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                print(f"⚠️  世界状态更新错误: {e}")
+        if self.waiter is not None:
+            if not self.waiter.done():
+                self.waiter.set_result(snapshot)
+            self.waiter = None
+
+    async def next(self, after_seq, timeout=None):
+        """等待序号大于 after_seq 的快照；已有更新的快照时立即返回，超时返回当前最新快照"""
+        if self.latest.seq > after_seq:
+            return self.latest
+        if self.waiter is None:
+            self.waiter = asyncio.get_running_loop().create_future()
+        try:
+            # 多个控制循环共享同一个 future，shield 保证其中一个被取消时不影响其他等待者
+            await asyncio.wait_for(asyncio.shield(self.waiter), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.latest